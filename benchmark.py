@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import argparse
+import resource
+from time import time
+from glob import glob
+from multiprocessing import Pool
+from maxSAT import MAXSatSolver
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DIRECTORIES = [os.path.join(ROOT, 'tests', 'samples'), os.path.join(ROOT, 'tests', 'saved')]
+DEFAULT_BASELINE = os.path.join(ROOT, 'results', 'benchmarks', 'baseline.json')
+
+# NOTE: metric name -> +1 if higher is better, -1 if lower is better
+METRICS = {
+    'flips_per_sec': 1,
+    'restarts_per_sec': 1,
+    'satisfied': 1,
+    'parse_time': -1,
+    'prepare_time': -1,
+    'peak_memory_kb': -1,
+}
+# NOTE: timing metrics below this many seconds are noise, they never count as a regression
+MIN_TIME = 0.01
+TIME_METRICS = ('parse_time', 'prepare_time')
+# NOTE: a rate counted over fewer flips or restarts than this, eg. on a problem solved in milliseconds, is too coarse to compare
+MIN_RATE_COUNT = 100
+RATE_COUNTS = {'flips_per_sec': 'flips', 'restarts_per_sec': 'restarts'}
+# NOTE: the rates vary by about 15% and the satisfied count by a few tenths of a percent between runs of the same seed,
+# the medians of several runs and the default tolerances keep the comparison above that noise
+DEFAULT_REPEATS = 3
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_SATISFIED_TOLERANCE = 0.005
+# NOTE: the largest bundled problem (50000 variables) takes about 1.5 seconds to preprocess, index and score,
+# this timeout still leaves every bundled problem several seconds of walk to measure the rates on
+DEFAULT_TIMEOUT_SEC = 5.0
+# NOTE: improvements closer together than this are merged into one point of the satisfied over time curve
+CURVE_RESOLUTION_SEC = 0.01
+
+
+class BenchmarkSolver(MAXSatSolver):
+    """
+    a max sat solver recording the number of satisfied clauses over time on every improvement
+    and the time spent walking, which the preprocessing and indexing before it would otherwise blur the rates with
+    """
+    def maxWalkSAT(self):
+        init = time()
+        try:
+            return MAXSatSolver.maxWalkSAT(self)
+        finally:
+            self.walk_time += time() - init
+
+    def saveBest(self, assignment, init, live=False):
+        MAXSatSolver.saveBest(self, assignment, init, live)
+        point = (round(self.time_to_best, 6), self.satisfied_offset + self.total_weight - self.best_objective)
+        if len(self.curve) > 1 and point[0] - self.curve[-2][0] < CURVE_RESOLUTION_SEC:
+            self.curve[-1] = point
+        else:
+            self.curve.append(point)
+
+
+def benchmarkFile(args):
+    """
+    run the solver on a single problem file in a fresh pool process and return its measurements
+    """
+    file_name, timeout, random_seed = args
+    solver = BenchmarkSolver(timeout, random_seed=random_seed)
+    solver.curve = []
+    solver.walk_time = 0.0
+
+    init = time()
+    solver.loadCNFFile(file_name)
+    parse_time = time() - init
+
+    init = time()
+    solver._search()
+    search_time = time() - init
+
+    return {
+        'file': os.path.relpath(os.path.abspath(file_name), ROOT),
+        'no_vars': solver.no_vars,
+        'no_clauses': solver.no_clauses,
+        'parse_time': parse_time,
+        'search_time': search_time,
+        # NOTE: the preprocessing, indexing and scoring set up around the walk, by now the largest startup cost after the parsing
+        'prepare_time': search_time - solver.walk_time,
+        'walk_time': solver.walk_time,
+        'flips': solver.flips,
+        'restarts': solver.restarts,
+        'flips_per_sec': solver.flips / max(solver.walk_time, 1e-9),
+        'restarts_per_sec': solver.restarts / max(solver.walk_time, 1e-9),
+        'satisfied': solver.satisfiedCount(solver.best_assignment),
+        'time_to_best': solver.time_to_best,
+        'peak_memory_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'curve': solver.curve,
+    }
+
+
+def median(values):
+    """
+    return the median of the non empty list of @param values
+    """
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle-1] + values[middle]) / 2.0
+
+
+def medianResult(runs):
+    """
+    return the run of @param runs with the median satisfied count, with every metric of METRICS and the counts behind the rates
+    replaced by their medians over @param runs
+    """
+    runs = sorted(runs, key=lambda run: run['satisfied'])
+    result = dict(runs[len(runs) // 2])
+    for metric in list(METRICS) + RATE_COUNTS.values():
+        result[metric] = median([run[metric] for run in runs])
+    result['repeats'] = len(runs)
+    return result
+
+
+def compare(result, baseline, tolerance, satisfied_tolerance):
+    """
+    return the list of metrics of @param result which are worse than @param baseline by more than @param tolerance
+    or by more than @param satisfied_tolerance for the satisfied count
+    """
+    regressions = []
+    for metric, direction in sorted(METRICS.items()):
+        old, new = baseline.get(metric), result[metric]
+        if old is None:
+            continue
+        if metric in RATE_COUNTS and min(baseline[RATE_COUNTS[metric]], result[RATE_COUNTS[metric]]) < MIN_RATE_COUNT:
+            continue
+        if metric == 'satisfied':
+            worse = new < old * (1 - satisfied_tolerance)
+        elif direction > 0:
+            worse = new < old * (1 - tolerance)
+        else:
+            worse = new > old * (1 + tolerance) and not (metric in TIME_METRICS and new - old < MIN_TIME)
+        if worse:
+            regressions.append('{}: {:.6g} -> {:.6g}'.format(metric, old, new))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MAX-SAT solver on the bundled problem files and compare against a stored baseline")
+    parser.add_argument("-d", "--directories", help="directories containing MAX-SAT problem files", nargs='+', default=DEFAULT_DIRECTORIES)
+    parser.add_argument("-t", "--timeout_in_seconds", help="time in seconds for each problem file, preprocessing included", type=float, default=DEFAULT_TIMEOUT_SEC)
+    parser.add_argument("-s", "--seed", help="seed of the random generators, run i of a problem file uses seed + i", type=int, default=0)
+    parser.add_argument("-r", "--repeats", help="runs per problem file, the medians of their measurements are reported and compared", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("-o", "--report", help="path of the json report with every measurement and satisfied over time curve", default=None)
+    parser.add_argument("-b", "--baseline", help="path of the baseline json report to compare against", default=DEFAULT_BASELINE)
+    parser.add_argument("--save_baseline", help="store this run as the new baseline instead of comparing", action='store_true')
+    parser.add_argument("--tolerance", help="relative slack before a rate, time or memory metric counts as a regression", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--satisfied_tolerance", help="relative slack before the satisfied count counts as a regression", type=float, default=DEFAULT_SATISFIED_TOLERANCE)
+    args = parser.parse_args()
+
+    file_names = sorted(file_name for directory in args.directories for file_name in glob(os.path.join(directory, '*')))
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = dict((result['file'], result) for result in json.load(file)['results'])
+
+    results = []
+    regressed = 0
+    print('|file \t| parse s \t| prepare s \t| flips/s \t| restarts/s \t| satisfied \t| time to best \t| peak KB \t|')
+    # NOTE: one process per problem file so the peak memory of each file is measured on its own
+    pool = Pool(1, maxtasksperchild=1)
+    for file_name in file_names:
+        result = medianResult([pool.apply(benchmarkFile, ((file_name, args.timeout_in_seconds, args.seed + run_i),))
+                               for run_i in range(args.repeats)])
+        results.append(result)
+        print "%s \t%2.6f \t%2.6f \t%10.1f \t%8.1f \t%d \t%2.6f \t%d" % (
+            result['file'], result['parse_time'], result['prepare_time'], result['flips_per_sec'], result['restarts_per_sec'],
+            result['satisfied'], result['time_to_best'], result['peak_memory_kb'])
+        if result['file'] in baseline:
+            regressions = compare(result, baseline[result['file']], args.tolerance, args.satisfied_tolerance)
+            if regressions:
+                regressed += 1
+                print "\tREGRESSION", '; '.join(regressions)
+    pool.close()
+    pool.join()
+
+    report = {'timeout_in_seconds': args.timeout_in_seconds, 'seed': args.seed, 'repeats': args.repeats, 'results': results}
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(report, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=1)
+        print('baseline saved to {}'.format(args.baseline))
+    elif baseline:
+        print('{} of {} problem files regressed against {}'.format(regressed, len(results), args.baseline))
+    return 1 if regressed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
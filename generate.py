@@ -0,0 +1,131 @@
+import os
+import sys
+import argparse
+from random import Random
+from string import maketrans
+
+# NOTE: clauses are formatted and written this many at a time, the memory used does not grow with the number of clauses
+WRITE_CHUNK_CLAUSES = 65536
+VARIANTS = ('random', 'planted', 'unsat')
+# NOTE: translation of the binary digits '0' / '1' into the bytes of a bytearray assignment, as BIT_VALUES of maxSAT.py
+BIT_VALUES = maketrans('01', '\x00\x01')
+
+
+def plantedAssignment(rng, no_vars):
+    """
+    return the hidden assignment of @param no_vars variables drawn from @param rng, every clause of a planted instance is satisfied by it
+    """
+    if not no_vars:
+        return bytearray()
+    return bytearray(format(rng.getrandbits(no_vars), '0{}b'.format(no_vars)).translate(BIT_VALUES))
+
+
+def randomClause(rng, no_vars, width, planted=None):
+    """
+    return a clause of @param width distinct variables of 1..@param no_vars with random signs drawn from @param rng
+    with @param planted a clause falsified by the planted assignment gets one of its literals negated
+    """
+    variables = []
+    while len(variables) < width:
+        var = int(rng.random() * no_vars) + 1
+        if var not in variables:
+            variables.append(var)
+    signs = rng.getrandbits(width)
+    clause = [var if (signs >> var_i) & 1 else -var for var_i, var in enumerate(variables)]
+    if planted is not None and not any((literal > 0) == planted[abs(literal)-1] for literal in clause):
+        literal_i = int(rng.random() * width)
+        clause[literal_i] = -clause[literal_i]
+    return clause
+
+
+def unsatCore(rng, no_vars, width):
+    """
+    return the 2^@param width clauses of every sign combination over @param width distinct random variables
+    every assignment falsifies exactly one of them
+    """
+    variables = randomClause(rng, no_vars, width)
+    return [[var if (signs >> var_i) & 1 else -var for var_i, var in enumerate(map(abs, variables))] for signs in xrange(2**width)]
+
+
+def generateClauses(no_vars, width, no_clauses, random_seed, variant='random', cores=1):
+    """
+    yield the @param no_clauses clauses of the instance one by one, the same @param random_seed always gives the same clauses
+    planted: every clause is satisfied by a hidden assignment, unsat: @param cores unsatisfiable cores of 2^width clauses each
+    are spread over a planted instance so exactly no_clauses - cores clauses can be satisfied
+    """
+    rng = Random(random_seed)
+    planted = plantedAssignment(rng, no_vars) if variant != 'random' else None
+    core_every = no_clauses // cores if variant == 'unsat' else 0
+    clause_i = 0
+    while clause_i < no_clauses:
+        if core_every and clause_i % core_every == 0 and clause_i // core_every < cores:
+            for clause in unsatCore(rng, no_vars, width):
+                yield clause
+            clause_i += 2**width
+        else:
+            yield randomClause(rng, no_vars, width, planted)
+            clause_i += 1
+
+
+def writeInstance(file_name, no_vars, width, no_clauses, random_seed, variant='random', cores=1):
+    """
+    stream the instance of generateClauses to @param file_name in the generator format
+    ie. the number of variables, the clause width and the number of clauses on a line each followed by one clause per line
+    """
+    if variant == 'unsat' and cores < 1:
+        raise ValueError('the unsat variant needs at least 1 core')
+    if variant == 'unsat' and cores * 2**width > no_clauses:
+        raise ValueError('{} unsatisfiable cores need at least {} clauses'.format(cores, cores * 2**width))
+    if width > no_vars:
+        raise ValueError('a clause of width {} needs at least {} variables'.format(width, width))
+    clause_format = ' '.join(['%d'] * width) + '\n'
+    clauses = generateClauses(no_vars, width, no_clauses, random_seed, variant, cores)
+    # NOTE: write to a temporary file and rename so an interrupted run never leaves a truncated instance behind
+    with open(file_name + '.tmp', 'w') as file:
+        file.write('{}\n{}\n{}\n'.format(no_vars, width, no_clauses))
+        chunk = []
+        for clause in clauses:
+            chunk.append(clause_format % tuple(clause))
+            if len(chunk) == WRITE_CHUNK_CLAUSES:
+                file.write(''.join(chunk))
+                del chunk[:]
+        file.write(''.join(chunk))
+    os.rename(file_name + '.tmp', file_name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate MAX-SAT problem files in the format of tests/samples, streamed to disk in bounded memory")
+    parser.add_argument("-n", "--no_vars", help="number of variables", type=int, required=True)
+    parser.add_argument("-k", "--width", help="number of literals of every clause", type=int, default=3)
+    parser.add_argument("-r", "--ratio", help="number of clauses per variable", type=float, default=4.26)
+    parser.add_argument("-m", "--no_clauses", help="number of clauses, overrides --ratio", type=int, default=None)
+    parser.add_argument("--variant", help="random: uniform random clauses, planted: satisfied by a hidden assignment, "
+                        "unsat: planted plus --cores unsatisfiable cores so exactly no_clauses - cores clauses can be satisfied",
+                        choices=VARIANTS, default='random')
+    parser.add_argument("--cores", help="number of unsatisfiable cores of the unsat variant", type=int, default=1)
+    parser.add_argument("-i", "--instances", help="number of problem files, file i uses seed + i", type=int, default=1)
+    parser.add_argument("-s", "--seed", help="seed of the first problem file", type=int, default=0)
+    parser.add_argument("-d", "--directory", help="directory to write the problem files to", default='.')
+    args = parser.parse_args()
+
+    no_clauses = args.no_clauses if args.no_clauses is not None else int(round(args.ratio * args.no_vars))
+    if args.width < 1:
+        parser.error('--width has to be at least 1')
+    if args.no_vars < args.width:
+        parser.error('a clause of width {} needs at least {} variables'.format(args.width, args.width))
+    if no_clauses < 0:
+        parser.error('the number of clauses can not be negative')
+    if args.variant == 'unsat' and args.cores < 1:
+        parser.error('--variant unsat needs at least 1 core')
+    if args.variant == 'unsat' and args.cores * 2**args.width > no_clauses:
+        parser.error('{} unsatisfiable cores need at least {} clauses'.format(args.cores, args.cores * 2**args.width))
+    if not os.path.isdir(args.directory):
+        os.makedirs(args.directory)
+    for instance_i in range(1, args.instances+1):
+        file_name = os.path.join(args.directory, 'max-sat-problem-{}-{}-{}-{}.txt'.format(args.no_vars, args.width, no_clauses, instance_i))
+        writeInstance(file_name, args.no_vars, args.width, no_clauses, args.seed + instance_i - 1, args.variant, args.cores)
+        print(file_name)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
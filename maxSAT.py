@@ -1,15 +1,115 @@
+import os
 import sys
+import json
+import signal
+import struct
+import hashlib
 import traceback
 import argparse
-from time import time
+from array import array
+from string import maketrans
+from operator import xor
+from time import time, sleep
 from glob import glob
-from random import random, sample, seed
-from collections import Counter
+from itertools import izip, imap, islice, compress
+from random import random, sample, seed, getrandbits, getstate, setstate
+from collections import OrderedDict, defaultdict
+from cStringIO import StringIO
+from multiprocessing import Process, Lock, Value, Array, Pool, TimeoutError
+try:
+    import numpy as np
+except ImportError:
+    # NOTE: numpy is optional, without it the clause matrix and the batched evaluation are simply not used
+    np = None
+
+# NOTE: layout of the binary cache header: magic, file size, file mtime, no_vars, no_literals_clause, no_clauses, number of literals
+CNF_CACHE_MAGIC = b'MAXSAT01'
+CNF_CACHE_HEADER = '<8sqdiiiq'
+# NOTE: portfolio workers publish at most this often as copying a large assignment on every improving flip kills the flip rate
+PUBLISH_INTERVAL_SEC = 0.1
+# NOTE: time the portfolio waits after the timeout for the workers to publish their final best before terminating them
+PORTFOLIO_GRACE_SEC = 1.0
+# NOTE: the walkSAT warm up of exact mode stops after this many restarts or this fraction of exact_walk_sec without improving,
+# a small instance reaches its optimum in a few restarts and need not wait out exact_walk_sec before the branch and bound
+EXACT_WALK_STALL_RESTARTS = 10
+EXACT_WALK_STALL_FRACTION = 0.2
+# NOTE: the search engines of maxWalkSAT, see the engine argument of MAXSatSolver
+ENGINES = ('walksat', 'paws')
+# NOTE: solveCNFFilesScheduled does not start a search with less time than this
+SCHEDULER_MIN_SLICE_SEC = 0.5
+# NOTE: number of initial assignment hashes remembered by the restart deduplication, the least recently tried are forgotten first
+RESTART_HISTORY_SIZE = 4096
+# NOTE: translation of the binary digits '0' / '1' into the bytes of a bytearray assignment
+BIT_VALUES = maketrans('01', '\x00\x01')
+# NOTE: preprocessCNF takes about this long per clause, it is left out when that exceeds this fraction of the timeout
+PREPROCESS_SEC_PER_CLAUSE = 2e-5
+PREPROCESS_TIMEOUT_FRACTION = 0.25
+# NOTE: the solver fields set up by preprocessCNF, buildOccurrenceIndex and buildClauseMatrix which the search only reads, ie. a prepared instance
+PREPARED_FIELDS = ('no_vars', 'no_literals_clause', 'no_clauses', 'cnf', 'weights', 'satisfied_offset', 'total_weight', 'preprocessed',
+                   'index_literals', 'index_offsets', 'tautologies', 'positive_clauses', 'positive_offsets', 'negative_clauses', 'negative_offsets',
+                   'clause_var_index', 'clause_sign', 'clause_weight')
+
+class FlatCNF():
+    """
+    a read only list of clauses kept as one flat int array of literals instead of a list of tuples of python ints
+    clause i is literals[i*width:(i+1)*width] for a fixed width cnf and literals[offsets[i]:offsets[i+1]] otherwise
+    a clause only becomes a tuple when it is indexed or iterated
+    """
+    def __init__(self, literals, width=None, offsets=None):
+        self.literals = literals
+        self.width = width
+        self.offsets = offsets
+
+    @staticmethod
+    def fromClauses(clauses):
+        """
+        pack the iterable of @param clauses, the offsets are dropped if every clause has the same width
+        """
+        literals = array('i')
+        offsets = array('l', [0])
+        for clause in clauses:
+            literals.extend(clause)
+            offsets.append(len(literals))
+        width = offsets[1] if len(offsets) > 1 else 0
+        if width and len(literals) == width * (len(offsets)-1) and all(offsets[i] == i*width for i in xrange(len(offsets))):
+            return FlatCNF(literals, width=width)
+        return FlatCNF(literals, offsets=offsets)
+
+    def __len__(self):
+        if self.offsets is not None:
+            return len(self.offsets)-1
+        return len(self.literals) // self.width if self.width else 0
+
+    def __getitem__(self, clause_i):
+        if clause_i < 0:
+            clause_i += len(self)
+        if not 0 <= clause_i < len(self):
+            raise IndexError('clause index out of range')
+        if self.offsets is not None:
+            return tuple(self.literals[self.offsets[clause_i]:self.offsets[clause_i+1]])
+        return tuple(self.literals[clause_i*self.width:(clause_i+1)*self.width])
+
+    def __iter__(self):
+        if self.offsets is not None:
+            return (tuple(self.literals[start:end]) for start, end in izip(self.offsets, islice(self.offsets, 1, None)))
+        # NOTE: izip over the same iterator k times cuts the flat buffer into k wide clause tuples without a python level loop
+        return izip(*[iter(self.literals)]*self.width)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
 class MAXSatSolver():
     """
     a max sat solver object
     """
-    def __init__(self, timeout_duration_sec, max_flips=1000, noise=0.1, log=False):
+    def __init__(self, timeout_duration_sec, max_flips=1000, noise=0.1, log=False, population=1, cache_dir=None,
+                 workers=1, portfolio_noise=None, portfolio_max_flips=None, random_seed=None,
+                 stats_callback=None, stats_path=None, stats_interval=5.0, preprocess=True,
+                 exact=False, exact_max_vars=64, exact_walk_sec=1.0,
+                 stall_restarts=None, stall_fraction=None, total_budget=None,
+                 engine='walksat', paws_flat=0.15, paws_decrease_period=10,
+                 improvement_callback=None, checkpoint_dir=None, checkpoint_interval=60.0, resume=False, lookahead=2):
         """
         a constructor for max sat solver
         
@@ -17,6 +117,29 @@ class MAXSatSolver():
         timeout_duration_sec -- the maximum time in seconds our solver will spend on finding the best max sat solution 
         max_flips -- maximum number of flips each iterative try is allowed to perform
         noise -- the probability with which we pick a random move instead of a greedy move
+        population -- number of random initial assignments generated and ranked together on each restart, needs numpy
+        cache_dir -- directory holding the binary cache of parsed problem files, None disables the cache
+        workers -- number of processes running maxWalkSAT restarts in parallel, 1 keeps the search in this process
+        portfolio_noise -- list of noise values handed round robin to the workers, None gives every worker @param noise
+        portfolio_max_flips -- list of max_flips values handed round robin to the workers, None keeps the default max_flips, not allowed with the paws engine
+        random_seed -- seed of the random generators, worker i is seeded with random_seed + i, None seeds from the system
+        stats_callback -- function called with the getStats dict every @param stats_interval seconds of the search
+        stats_path -- json file overwritten with the getStats dict every @param stats_interval seconds of the search, portfolio worker i writes stats_path.i instead
+        stats_interval -- seconds between two stats snapshots, snapshots are off if neither callback nor path is given
+        preprocess -- shrink the cnf with preprocessCNF before the search
+        exact -- prove the optimum with exactMaxSAT when the (preprocessed) cnf has at most @param exact_max_vars variables
+        exact_walk_sec -- seconds of maxWalkSAT run first in exact mode to get a good upper bound for the branch and bound
+        stall_restarts -- stop the search after this many restarts without improving the best assignment, None never stops, not allowed with the paws engine which never restarts
+        stall_fraction -- stop the search after this fraction of timeout_duration_sec without improving the best assignment, None never stops
+        total_budget -- time in seconds for solving a whole directory with solveCNFFilesScheduled instead of timeout_duration_sec per file
+        engine -- 'walksat' for the free / noise / greedy moves, 'paws' to steer the moves by dynamic clause weights without restarts
+        paws_flat -- the probability with which the paws engine takes a move which leaves the weighted score unchanged
+        paws_decrease_period -- the paws engine takes one off every raised clause weight after this many weight increases
+        improvement_callback -- function called with the time, the number of satisfied clauses and a copy of the assignment on every improvement
+        checkpoint_dir -- directory holding a checkpoint of every instance, written every @param checkpoint_interval seconds and at the end of the search
+        checkpoint_interval -- seconds between two checkpoints
+        resume -- continue from the checkpoint of the instance in @param checkpoint_dir instead of starting a fresh random search
+        lookahead -- a greedy walkSAT move flips up to this many variables, each following flip repairs a clause broken by the previous one if that strictly gains
         """
         self.cnf = []
         self.best_assignment = None
@@ -26,9 +149,86 @@ class MAXSatSolver():
         self.timeout_duration_sec = timeout_duration_sec
         self.max_flips = max_flips
         self.noise = noise
-        self.tried_count = Counter()
+        self.tried_count = OrderedDict()
+        self.zobrist_keys = array('L')
         self.log = log
-        seed()
+        self.index_literals = array('i')
+        self.index_offsets = array('l', [0])
+        self.tautologies = set()
+        self.positive_clauses = array('i')
+        self.positive_offsets = array('l')
+        self.negative_clauses = array('i')
+        self.negative_offsets = array('l')
+        self.scored_assignment = None
+        self.true_count = []
+        self.true_sum = []
+        self.break_score = []
+        self.make_score = []
+        self.unsat_clauses = []
+        self.unsat_position = []
+        self.best_objective = None
+        self.best_source = None
+        self.best_journal = array('i')
+        self.population = population
+        self.cache_dir = cache_dir
+        self.clause_var_index = None
+        self.clause_sign = None
+        self.clause_weight = None
+        self.weights = []
+        self.score_weights = []
+        self.penalized = []
+        if engine not in ENGINES:
+            raise ValueError('unknown engine {!r}, use one of {}'.format(engine, ', '.join(ENGINES)))
+        if engine == 'paws' and stall_restarts:
+            raise ValueError('the paws engine never restarts, use stall_fraction instead of stall_restarts')
+        if engine == 'paws' and portfolio_max_flips:
+            raise ValueError('the paws engine never restarts, portfolio_max_flips would make its workers restart')
+        self.engine = engine
+        self.paws_flat = paws_flat
+        self.paws_decrease_period = paws_decrease_period
+        self.total_weight = 0
+        self.satisfied_offset = 0
+        self.unsat_weight = 0
+        self.preprocess = preprocess
+        self.preprocessed = None
+        self.exact = exact
+        self.exact_max_vars = exact_max_vars
+        self.exact_walk_sec = exact_walk_sec
+        self.proven_optimal = False
+        self.stall_restarts = stall_restarts
+        self.stall_fraction = stall_fraction
+        self.total_budget = total_budget
+        self.workers = workers
+        self.portfolio_noise = portfolio_noise
+        self.portfolio_max_flips = portfolio_max_flips
+        self.random_seed = random_seed
+        self.shared_best = None
+        self.next_publish = 0
+        self.stats_callback = stats_callback
+        self.stats_path = stats_path
+        self.stats_interval = stats_interval
+        self.next_stats = float('inf')
+        self.improvement_callback = improvement_callback
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self.resume = resume
+        self.resume_assignment = None
+        self.start_assignment = None
+        self.instance_key = None
+        self.next_checkpoint = float('inf')
+        self.next_report = float('inf')
+        self.lookahead = lookahead
+        self.broken_from = 0
+        self.resetStats()
+        self.seedRandom(random_seed)
+
+    def seedRandom(self, random_seed):
+        """
+        seed both the python and the numpy random generators with @param random_seed, None seeds them from the system
+        """
+        seed(random_seed)
+        if np is not None:
+            np.random.seed(random_seed)
     
     def _solve(self):
         """
@@ -38,11 +238,7 @@ class MAXSatSolver():
         # handles the timers and other utilities
         try:
             init = time()
-            self.best_assignment = None
-            # NOTE: by our observation of all true and alternte true, false n clauses cnf we need at least n/2 max_flips for best performance for satisfiable clauses
-            self.max_flips = self.no_clauses/2 + 1
-            self.tried_count = Counter()
-            self.maxWalkSAT()
+            self._search()
         except KeyboardInterrupt:
             print("\nearly terminating the best results are:")
 
@@ -50,9 +246,326 @@ class MAXSatSolver():
             traceback.print_exc(file=sys.stdout)
         # print("best assignment: {}".format(self.best_assignment))
         print("number of satisfied clauses: {}".format(self.satisfiedCount(self.best_assignment)))
+        if self.proven_optimal:
+            print("proven optimal")
         print("time: %2.6f seconds" % ((time()-init)))
         print('-'*50)
 
+    def _search(self, prepared=None):
+        """
+        reset the search state and run the search on the cnf loaded by solveCNF, solveCNFFiles or solveCNFFilesBatch
+        @param prepared is the result of prepareInstance on the loaded cnf, its preprocessing and indexes are reused instead of rebuilt
+        the preprocessing and the indexing count against self.timeout_duration_sec, the search gets the time left after them
+        """
+        init = time()
+        timeout_duration_sec = self.timeout_duration_sec
+        self.best_assignment = None
+        self.best_objective = None
+        self.best_source = None
+        self.resume_assignment = None
+        self.resetStats()
+        # NOTE: the checkpoint belongs to the instance as given, so it is keyed before preprocessing changes the cnf
+        self.instance_key = self.getInstanceKey() if self.checkpoint_dir else None
+        if prepared is None:
+            original = self.preprocessInstance()
+        else:
+            original, fields = prepared
+            for field in PREPARED_FIELDS:
+                setattr(self, field, fields[field])
+        try:
+            # NOTE: by our observation of all true and alternte true, false n clauses cnf we need at least n/2 max_flips for best performance for satisfiable clauses
+            self.max_flips = self.no_clauses/2 + 1
+            if self.engine == 'paws':
+                # NOTE: the clause weights lead the walk out of local minima, a restart would only throw the walk away
+                self.max_flips = sys.maxint
+            self.tried_count = OrderedDict()
+            # NOTE: zobrist hashing, the hash of an assignment is the xor of the random keys of its true variables
+            self.zobrist_keys = array('L', (getrandbits(64) for _ in xrange(self.no_vars)))
+            # NOTE: the paws engine raises its own copy of the weights, self.weights stays the objective
+            self.score_weights = list(self.weights) if self.engine == 'paws' else self.weights
+            self.penalized = []
+            if prepared is None:
+                self.buildOccurrenceIndex()
+                self.buildClauseMatrix()
+            if self.resume and self.cnf:
+                self.resumeCheckpoint()
+            if self.start_assignment is not None and self.resume_assignment is None and self.cnf:
+                self.resumeAssignment(self.start_assignment)
+            self.next_checkpoint = time() + self.checkpoint_interval if self.checkpoint_dir else float('inf')
+            self.timeout_duration_sec = max(0.0, timeout_duration_sec - (time() - init))
+            if not self.cnf:
+                # NOTE: preprocessing decided every clause, any assignment of the remaining variables is optimal
+                self.best_assignment = bytearray(self.no_vars)
+                self.best_objective = 0
+                self.time_to_best = time() - self.search_start
+                self.proven_optimal = True
+            elif self.exact and self.no_vars <= self.exact_max_vars:
+                self.exactSearch()
+            elif self.workers > 1:
+                self.portfolioWalkSAT()
+            else:
+                self.maxWalkSAT()
+        finally:
+            self.timeout_duration_sec = timeout_duration_sec
+            if original:
+                self.restoreCNF(original)
+            if self.checkpoint_dir and self.best_assignment is not None:
+                self.writeCheckpoint()
+
+    def preprocessInstance(self):
+        """
+        give every clause of the loaded cnf the weight 1 and preprocess it if enabled: with preprocessCNF if needsFullPreprocess
+        and its estimated time fits in the timeout, otherwise only with removePureLiterals
+        return the original instance to hand to restoreCNF, None if the cnf was not preprocessed
+        """
+        self.weights = [1] * len(self.cnf)
+        self.satisfied_offset = 0
+        original = None
+        if self.preprocess:
+            if (len(self.cnf) * PREPROCESS_SEC_PER_CLAUSE <= PREPROCESS_TIMEOUT_FRACTION * self.timeout_duration_sec
+                    and self.needsFullPreprocess()):
+                original = self.preprocessCNF()
+            else:
+                original = self.removePureLiterals()
+        self.total_weight = sum(self.weights)
+        return original
+
+    def prepareInstance(self):
+        """
+        preprocess and index the loaded cnf once, return it as a prepared instance which _search reuses instead of redoing the work
+        the solver itself is left with the loaded cnf, a prepared instance is only read by the searches and can be shared between them
+        """
+        self.best_assignment = None
+        original = self.preprocessInstance()
+        try:
+            self.buildOccurrenceIndex()
+            self.buildClauseMatrix()
+            return original, dict((field, getattr(self, field)) for field in PREPARED_FIELDS)
+        finally:
+            if original:
+                self.restoreCNF(original)
+
+    def needsFullPreprocess(self):
+        """
+        a single linear scan of self.cnf, True if it has a tautology or a repeated literal, a clause of at most one literal or a duplicate clause
+        the only reductions besides pure literals, which removePureLiterals handles without the sort, renumber and copy of preprocessCNF
+        """
+        if np is not None and isinstance(self.cnf, FlatCNF) and self.cnf.width:
+            if self.cnf.width < 2:
+                return True
+            literals = np.frombuffer(self.cnf.literals, dtype=np.intc).reshape(-1, self.cnf.width)
+            variables = np.sort(np.abs(literals), axis=1)
+            if (variables[:, 1:] == variables[:, :-1]).any():
+                return True
+            # NOTE: sorting the sorted clauses lexicographically puts duplicate clauses next to each other
+            literals = np.sort(literals, axis=1)
+            literals = literals[np.lexsort(literals.T[::-1])]
+            return bool((literals[1:] == literals[:-1]).all(axis=1).any())
+        # NOTE: only the hashes of the sorted clauses are kept, a collision merely sends the cnf through preprocessCNF
+        clause_hashes = set()
+        for clause in self.cnf:
+            if len(clause) < 2 or len(set(imap(abs, clause))) < len(clause):
+                return True
+            key = hash(tuple(sorted(clause)))
+            if key in clause_hashes:
+                return True
+            clause_hashes.add(key)
+        return False
+
+    def removePureLiterals(self):
+        """
+        fix every pure literal ie. a literal whose negation occurs in no clause to true and remove the clauses it satisfies,
+        repeated until no clause is removed, the remaining clauses keep their order and the variables keep their numbers
+        a fixed variable is left in no clause, getOriginalAssignment gives it its fixed value
+
+        return the original instance to be put back by restoreCNF, None if there is no pure literal
+        """
+        original = (self.no_vars, self.no_literals_clause, self.no_clauses, self.cnf, self.weights)
+        no_vars = self.no_vars
+        fixed = {}
+        if np is not None and isinstance(self.cnf, FlatCNF) and self.cnf.width:
+            # NOTE: literal l is counted at l + no_vars so the count of -l is the count of l read backwards
+            literals = np.frombuffer(self.cnf.literals, dtype=np.intc).reshape(-1, self.cnf.width) + no_vars
+            kept = np.ones(len(literals), dtype=bool)
+            while True:
+                counts = np.bincount(literals[kept].ravel(), minlength=2*no_vars+1)
+                pure = (counts > 0) & (counts[::-1] == 0)
+                if not pure.any():
+                    break
+                for literal in np.flatnonzero(pure) - no_vars:
+                    fixed[abs(int(literal))] = literal > 0
+                kept &= ~pure[literals].any(axis=1)
+            if not fixed:
+                return None
+            cnf = FlatCNF(array('i'), width=self.cnf.width)
+            cnf.literals.fromstring((literals[kept] - no_vars).astype(np.intc).tostring())
+            kept = kept.tolist()
+        else:
+            counts = defaultdict(int)
+            for clause in self.cnf:
+                for literal in clause:
+                    counts[literal] += 1
+            kept = [True] * len(self.cnf)
+            pure = set(literal for literal, count in counts.iteritems() if count and not counts.get(-literal))
+            while pure:
+                for literal in pure:
+                    fixed[abs(literal)] = literal > 0
+                for clause_i, clause in enumerate(self.cnf):
+                    if kept[clause_i] and any(literal in pure for literal in clause):
+                        kept[clause_i] = False
+                        for literal in clause:
+                            counts[literal] -= 1
+                pure = set(literal for literal, count in counts.iteritems() if count and not counts.get(-literal))
+            if not fixed:
+                return None
+            cnf = FlatCNF.fromClauses(compress(self.cnf, kept))
+        self.cnf = cnf
+        self.weights = list(compress(self.weights, kept))
+        self.no_clauses = len(self.cnf)
+        self.satisfied_offset += sum(original[4]) - sum(self.weights)
+        self.preprocessed = (fixed, xrange(1, no_vars+1), no_vars)
+        if self.log:
+            print('pure literals fixed: {} no_clauses: {} -> {}'.format(len(fixed), len(original[3]), self.no_clauses))
+        return original
+
+    def preprocessCNF(self):
+        """
+        shrink self.cnf before the search without changing the best number of satisfied clauses
+        - tautologies are always satisfied and are removed
+        - duplicate clauses are merged into a single clause carrying their total weight
+        - the unit clauses (x) and (-x) always satisfy exactly one of them so the smaller weight is moved out as satisfied
+        - x is fixed to true if the unit clause (x) weighs at least as much as all clauses containing -x, this covers pure literals
+        clauses satisfied by a fixed variable are removed, its false literals are removed from the other clauses
+        and the remaining variables are renumbered from 1
+
+        return the original instance to be put back by restoreCNF
+        """
+        original = (self.no_vars, self.no_literals_clause, self.no_clauses, self.cnf, self.weights)
+        offset = 0
+        # NOTE: clauses are keyed by their sorted literals, a frozenset per clause costs several times the memory
+        clause_weight = {}
+        for clause, weight in izip(self.cnf, self.weights):
+            literals = set(clause)
+            if len(set(imap(abs, literals))) < len(literals):
+                offset += weight
+            else:
+                key = tuple(sorted(literals))
+                clause_weight[key] = clause_weight.get(key, 0) + weight
+        occurrences = defaultdict(list)
+        for key in clause_weight:
+            for var in key:
+                occurrences[var].append(key)
+
+        def live(literal):
+            # NOTE: occurrence lists are only ever appended to, the clauses removed since are dropped here
+            keys = occurrences[literal] = list(set(key for key in occurrences[literal] if key in clause_weight))
+            return keys
+
+        fixed = {}
+        # NOTE: only a unit clause or a pure literal fixes a variable, the other variables are looked at once fixing a neighbour shrank their clauses
+        pending = set(var for var in xrange(1, self.no_vars+1)
+                      if not occurrences[var] or not occurrences[-var] or (var,) in clause_weight or (-var,) in clause_weight)
+        while pending:
+            var = pending.pop()
+            positive_unit, negative_unit = (var,), (-var,)
+            if positive_unit in clause_weight and negative_unit in clause_weight:
+                cancelled = min(clause_weight[positive_unit], clause_weight[negative_unit])
+                offset += cancelled
+                for unit in (positive_unit, negative_unit):
+                    clause_weight[unit] -= cancelled
+                    if not clause_weight[unit]:
+                        del clause_weight[unit]
+
+            positive, negative = live(var), live(-var)
+            if not positive and not negative:
+                continue
+            if clause_weight.get(positive_unit, 0) >= sum(clause_weight[key] for key in negative):
+                true_literal, satisfied, falsified = var, positive, negative
+            elif clause_weight.get(negative_unit, 0) >= sum(clause_weight[key] for key in positive):
+                true_literal, satisfied, falsified = -var, negative, positive
+            else:
+                continue
+
+            fixed[var] = true_literal > 0
+            for key in satisfied:
+                offset += clause_weight.pop(key)
+                pending.update(abs(other) for other in key)
+            for key in falsified:
+                weight = clause_weight.pop(key)
+                pending.update(abs(other) for other in key)
+                shrunk = tuple(other for other in key if other != -true_literal)
+                # NOTE: a clause left without literals can never be satisfied and is dropped
+                if shrunk:
+                    if shrunk not in clause_weight:
+                        clause_weight[shrunk] = 0
+                        for other in shrunk:
+                            occurrences[other].append(shrunk)
+                    clause_weight[shrunk] += weight
+            del occurrences[var], occurrences[-var]
+            pending.discard(var)
+
+        clauses = sorted(clause_weight.iteritems())
+        clause_weight.clear()
+        occurrences.clear()
+        literals = set()
+        for clause, _ in clauses:
+            literals.update(clause)
+        variables = sorted(set(imap(abs, literals)))
+        renumbered = {}
+        for var_i, var in enumerate(variables):
+            renumbered[var], renumbered[-var] = var_i+1, -(var_i+1)
+        self.cnf = FlatCNF.fromClauses(map(renumbered.__getitem__, clause) for clause, _ in clauses)
+        self.weights = [weight for _, weight in clauses]
+        self.no_vars = len(variables)
+        self.no_literals_clause = max(len(clause) for clause, _ in clauses) if clauses else 0
+        self.no_clauses = len(self.cnf)
+        self.satisfied_offset = offset
+        self.preprocessed = (fixed, variables, original[0])
+        if self.log:
+            print('preprocessed no_vars: {} -> {} no_clauses: {} -> {} fixed: {} satisfied: {}'.format(
+                original[0], self.no_vars, len(original[3]), self.no_clauses, len(fixed), offset))
+        return original
+
+    def restoreCNF(self, original):
+        """
+        put back the @param original instance returned by preprocessCNF
+        and map self.best_assignment back to the original variables
+        """
+        if self.best_assignment is not None:
+            self.best_assignment = self.getOriginalAssignment(self.best_assignment)
+        self.no_vars, self.no_literals_clause, self.no_clauses, self.cnf, self.weights = original
+        self.total_weight = sum(self.weights)
+        self.satisfied_offset = 0
+        self.scored_assignment = None
+        self.clause_var_index = None
+        self.preprocessed = None
+        if self.best_assignment is not None:
+            self.best_objective = self.objective_function(self.best_assignment)
+
+    def getOriginalAssignment(self, assignment):
+        """
+        return a copy of @param assignment of the cnf being searched mapped back to the variables of the cnf before preprocessCNF
+        """
+        if self.preprocessed is None:
+            return bytearray(assignment)
+        fixed, variables, no_vars = self.preprocessed
+        # NOTE: variables which preprocessing neither fixed nor kept do not occur in any clause, their value does not matter
+        original = bytearray(no_vars)
+        for var_i, var in enumerate(variables):
+            original[var-1] = assignment[var_i]
+        # NOTE: removePureLiterals keeps the variables it fixes, so the fixed values go last
+        for var, value in fixed.items():
+            original[var-1] = value
+        return original
+
+    def getSearchAssignment(self, original):
+        """
+        return the assignment @param original of the cnf before preprocessCNF restricted to the variables of the cnf being searched
+        """
+        if self.preprocessed is None:
+            return bytearray(original)
+        return bytearray(original[var-1] for var in self.preprocessed[1])
+
     def solveCNF(self, no_vars, no_literals_clause, no_clauses, cnf):
         """
         solve a particular cnf
@@ -85,25 +598,187 @@ class MAXSatSolver():
         """
         for file_name in glob(absolute_path + '/*'):
             try:
-                with open(file_name) as file:
-                    data = file.readlines()
-                    self.no_vars = int(data[0])
-                    self.no_literals_clause = int(data[1])
-                    self.no_clauses = int(data[2])
-                    self.cnf = []
-                    for each in data[3:]:
-                        each = each.strip()
-                        if each:
-                            self.cnf.append(tuple(map(int, each.split())))
-                    print('no_literals_clause: {} no_clauses: {} no_vars: {}'.format(self.no_literals_clause, self.no_clauses, self.no_vars))
-                    if self.log:
-                        print('cnf', self.cnf)
-                        print('|time \t| # clauses_satisfied \t| retry_# \t| flip_#\t|')
-                    self._solve()
+                self.loadCNFFile(file_name)
+                print('no_literals_clause: {} no_clauses: {} no_vars: {}'.format(self.no_literals_clause, self.no_clauses, self.no_vars))
+                if self.log:
+                    print('cnf', self.cnf)
+                    print('|time \t| # clauses_satisfied \t| retry_# \t| flip_#\t|')
+                self._solve()
             except Exception as err:
                 print "Error parsing some file in", absolute_path, "\nerr:", err
                 print "-"*50
 
+    def solveCNFFilesScheduled(self, absolute_path):
+        """
+        solve all the problem files located at the absolute_path within self.total_budget seconds in total
+        every file gets an equal share of the remaining budget, so the time left by files which stalled or were solved early
+        goes to the following ones, and files still improving when their share ran out get another round with the time left over
+        which continues from the best assignment of their previous rounds instead of starting over
+
+        Keyword arguments:
+        absolute_path: absolute forward / path of the directory containing max-SAT problem files
+        """
+        deadline = time() + self.total_budget
+        timeout_duration_sec = self.timeout_duration_sec
+        best = {}
+        best_assignments = {}
+        pending = sorted(glob(absolute_path + '/*'))
+        round_i = 0
+        while pending and deadline - time() > SCHEDULER_MIN_SLICE_SEC:
+            round_i += 1
+            still_improving = []
+            for file_i, file_name in enumerate(pending):
+                self.timeout_duration_sec = (deadline - time()) / (len(pending) - file_i)
+                if self.timeout_duration_sec < SCHEDULER_MIN_SLICE_SEC:
+                    break
+                self.start_assignment = best_assignments.get(file_name)
+                try:
+                    self.loadCNFFile(file_name)
+                    print('round: {} file: {} time share: {:.3f} seconds'.format(round_i, file_name, self.timeout_duration_sec))
+                    print('no_literals_clause: {} no_clauses: {} no_vars: {}'.format(self.no_literals_clause, self.no_clauses, self.no_vars))
+                    self._solve()
+                except Exception as err:
+                    print "Error parsing some file in", absolute_path, "\nerr:", err
+                    print "-"*50
+                    continue
+                if self.best_assignment is None:
+                    continue
+                satisfied = self.satisfiedCount(self.best_assignment)
+                if file_name not in best or satisfied > best[file_name]:
+                    best[file_name] = satisfied
+                    best_assignments[file_name] = self.best_assignment
+                if not (self.stalled or self.proven_optimal or self.best_objective == 0):
+                    still_improving.append(file_name)
+            pending = still_improving
+        self.timeout_duration_sec = timeout_duration_sec
+        self.start_assignment = None
+
+        print('best over {} rounds:'.format(round_i))
+        for file_name in sorted(best):
+            print('{}: number of satisfied clauses: {}'.format(file_name, best[file_name]))
+
+    def solveCNFFilesBatch(self, absolute_path, results_path):
+        """
+        solve all the problem files located at the absolute_path on a pool of self.workers processes, each file with the full timeout
+        and append one json record per problem file to @param results_path as soon as it is solved
+        problem files which already have a record in @param results_path are skipped so an interrupted sweep can be resumed
+
+        Keyword arguments:
+        absolute_path: absolute forward / path of the directory containing max-SAT problem files
+        results_path: path of the json lines file with the satisfied count, time to best, restarts, flips and assignment of every problem file
+        """
+        done = set()
+        if os.path.exists(results_path):
+            with open(results_path) as results:
+                for line in results:
+                    try:
+                        done.add(json.loads(line)['file'])
+                    except ValueError:
+                        # NOTE: a sweep killed while writing leaves a truncated last line, that file is simply solved again
+                        pass
+        file_names = [file_name for file_name in sorted(glob(absolute_path + '/*')) if os.path.abspath(file_name) not in done]
+        print('problem files to solve: {} already solved: {}'.format(len(file_names), len(done)))
+
+        pool = Pool(self.workers, _ignoreInterrupt)
+        try:
+            with open(results_path, 'a') as results:
+                records = pool.imap_unordered(_batchWorker, [(self, file_name) for file_name in file_names])
+                for _ in file_names:
+                    record = _nextResult(records)
+                    results.write(json.dumps(record) + '\n')
+                    results.flush()
+                    if 'error' in record:
+                        print "Error parsing", record['file'], "\nerr:", record['error']
+                    else:
+                        print('{}: number of satisfied clauses: {} time to best: {:.6f} restarts: {} flips: {}'.format(
+                            record['file'], record['satisfied'], record['time_to_best'], record['restarts'], record['flips']))
+            pool.close()
+        except KeyboardInterrupt:
+            print("\nearly terminating the sweep, the solved problem files are kept in {}".format(results_path))
+            pool.terminate()
+        pool.join()
+
+    def loadCNFFile(self, file_name):
+        """
+        parse the problem file @param file_name in the generator format into self.no_vars, self.no_literals_clause, self.no_clauses and self.cnf
+        the header and all the clauses are converted in bulk into the flat int buffer of a FlatCNF, only ragged files fall back to a per line parse
+        """
+        literals = self.readCNFCache(file_name)
+        if literals is None:
+            with open(file_name) as file:
+                literals = self.parseCNF(file.read())
+            if literals is not None:
+                self.writeCNFCache(file_name, literals)
+            return
+        self.cnf = FlatCNF(literals, width=self.no_literals_clause)
+
+    def parseCNF(self, text):
+        """
+        parse the problem @param text in the generator format into self.no_vars, self.no_literals_clause, self.no_clauses and self.cnf
+        return the flat literal buffer of a fixed width cnf, None for a ragged one
+        """
+        tokens = text.split()
+        self.no_vars = int(tokens[0])
+        self.no_literals_clause = int(tokens[1])
+        self.no_clauses = int(tokens[2])
+        del tokens[:3]
+        # NOTE: the bulk path cuts the flat literals into no_literals_clause wide clauses, so it is only taken if every clause line has exactly that width
+        # the lines are checked one at a time from a StringIO instead of splitting the whole text into a list of lines
+        width = self.no_literals_clause
+        if not width or not all(len(each.split()) == width for each in islice(StringIO(text), 3, None) if not each.isspace()):
+            del tokens
+            self.cnf = FlatCNF.fromClauses(map(int, each.split()) for each in text.splitlines()[3:] if each.strip())
+            return None
+        literals = array('i', imap(int, tokens))
+        del tokens
+        self.cnf = FlatCNF(literals, width=self.no_literals_clause)
+        return literals
+
+    def getCNFCachePath(self, file_name):
+        """
+        return the path of the binary cache of @param file_name in self.cache_dir
+        """
+        return os.path.join(self.cache_dir, hashlib.md5(os.path.abspath(file_name)).hexdigest() + '.cnf')
+
+    def readCNFCache(self, file_name):
+        """
+        return the flat literal buffer of @param file_name from the binary cache and set the header fields
+        None if the cache is disabled, missing or stale ie. the size or mtime of @param file_name changed
+        """
+        if not self.cache_dir:
+            return None
+        cache_path = self.getCNFCachePath(file_name)
+        if not os.path.exists(cache_path):
+            return None
+        stat = os.stat(file_name)
+        with open(cache_path, 'rb') as cache:
+            header = cache.read(struct.calcsize(CNF_CACHE_HEADER))
+            magic, size, mtime, no_vars, no_literals_clause, no_clauses, no_literals = struct.unpack(CNF_CACHE_HEADER, header)
+            if magic != CNF_CACHE_MAGIC or size != stat.st_size or mtime != stat.st_mtime:
+                return None
+            literals = array('i')
+            literals.fromfile(cache, no_literals)
+        self.no_vars = no_vars
+        self.no_literals_clause = no_literals_clause
+        self.no_clauses = no_clauses
+        return literals
+
+    def writeCNFCache(self, file_name, literals):
+        """
+        store the header fields and the flat literal buffer @param literals of @param file_name in the binary cache
+        keyed by the path, size and mtime of @param file_name
+        """
+        if not self.cache_dir:
+            return
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        stat = os.stat(file_name)
+        cache_path = self.getCNFCachePath(file_name)
+        # NOTE: write to a temporary file and rename so an interrupted run never leaves a truncated cache behind
+        with open(cache_path + '.tmp', 'wb') as cache:
+            cache.write(struct.pack(CNF_CACHE_HEADER, CNF_CACHE_MAGIC, stat.st_size, stat.st_mtime, self.no_vars, self.no_literals_clause, self.no_clauses, len(literals)))
+            literals.tofile(cache)
+        os.rename(cache_path + '.tmp', cache_path)
 
     def isClauseSatisfied(self, clause, assignment):
         """
@@ -114,93 +789,389 @@ class MAXSatSolver():
                 return True
         return False
 
+    def buildOccurrenceIndex(self):
+        """
+        build the flat index of the clauses of self.cnf searched by the incremental scores, duplicate literals removed
+        and for each variable the indexes of the clauses it occurs in positively and negatively
+        so that a flip only has to visit the clauses containing the flipped variable
+        clause i of the index is index_literals[index_offsets[i]:index_offsets[i+1]], the clauses of variable i
+        are positive_clauses[positive_offsets[i]:positive_offsets[i+1]] and the same for the negative ones
+        """
+        index_literals = array('i')
+        index_offsets = array('l', [0])
+        self.tautologies = set()
+        for clause_i, clause in enumerate(self.cnf):
+            literals = set(clause)
+            if any(-var in literals for var in literals):
+                # NOTE: a tautology is satisfied by every assignment so it never takes part in a make or break score
+                self.tautologies.add(clause_i)
+            else:
+                index_literals.extend(literals if len(literals) != len(clause) else clause)
+            index_offsets.append(len(index_literals))
+
+        # NOTE: count the occurrences of every literal first so the clause indexes can be written straight into flat arrays
+        positive_offsets = array('l', [0]) * (self.no_vars+1)
+        negative_offsets = array('l', [0]) * (self.no_vars+1)
+        for var in index_literals:
+            if var > 0:
+                positive_offsets[var] += 1
+            else:
+                negative_offsets[-var] += 1
+        for var_i in xrange(self.no_vars):
+            positive_offsets[var_i+1] += positive_offsets[var_i]
+            negative_offsets[var_i+1] += negative_offsets[var_i]
+        positive_clauses = array('i', [0]) * positive_offsets[-1]
+        negative_clauses = array('i', [0]) * negative_offsets[-1]
+        positive_next = array('l', positive_offsets)
+        negative_next = array('l', negative_offsets)
+        for clause_i in xrange(len(index_offsets)-1):
+            for var in index_literals[index_offsets[clause_i]:index_offsets[clause_i+1]]:
+                if var > 0:
+                    positive_clauses[positive_next[var-1]] = clause_i
+                    positive_next[var-1] += 1
+                else:
+                    negative_clauses[negative_next[-var-1]] = clause_i
+                    negative_next[-var-1] += 1
+        self.index_literals = index_literals
+        self.index_offsets = index_offsets
+        self.positive_clauses = positive_clauses
+        self.positive_offsets = positive_offsets
+        self.negative_clauses = negative_clauses
+        self.negative_offsets = negative_offsets
+
+    def buildClauseMatrix(self):
+        """
+        build the numpy representation of a fixed width k-CNF self.cnf
+        an int32 literal matrix of shape (no_clauses, k) split into the variable index and sign of every literal
+        """
+        self.clause_var_index = None
+        self.clause_sign = None
+        self.clause_weight = None
+        if np is None or not self.cnf:
+            return
+        if isinstance(self.cnf, FlatCNF):
+            if not self.cnf.width:
+                return
+            # NOTE: the flat literal buffer is viewed as the matrix without a copy
+            literals = np.frombuffer(self.cnf.literals, dtype=np.intc).reshape(-1, self.cnf.width)
+        else:
+            width = len(self.cnf[0])
+            if not width or any(len(clause) != width for clause in self.cnf):
+                return
+            literals = np.array(self.cnf, dtype=np.int32)
+        self.clause_var_index = np.abs(literals) - 1
+        self.clause_sign = literals > 0
+        self.clause_weight = None if self.total_weight == len(self.cnf) else np.array(self.weights, dtype=np.int64)
+
+    def satisfiedCountBatch(self, assignments):
+        """
+        return a numpy array with the number (total weight) of clauses of self.cnf satisfied by each row of @param assignments
+        @param assignments is a boolean matrix of shape (no_assignments, no_vars), or a list of assignments
+        """
+        if isinstance(assignments, bytearray):
+            assignments = np.frombuffer(assignments, dtype=np.bool_)
+        assignments = np.asarray(assignments, dtype=bool)
+        if assignments.ndim == 1:
+            assignments = assignments.reshape(1, -1)
+        counts = np.empty(len(assignments), dtype=np.int64)
+        # NOTE: evaluate in chunks so the (chunk, no_clauses, k) literal values stay around 16M booleans
+        chunk = max(1, (1 << 24) // max(1, self.clause_var_index.size))
+        for start in range(0, len(assignments), chunk):
+            values = assignments[start:start+chunk][:, self.clause_var_index]
+            satisfied = (values == self.clause_sign).any(axis=2)
+            counts[start:start+chunk] = satisfied.sum(axis=1) if self.clause_weight is None else satisfied.dot(self.clause_weight)
+        return counts
+
+    def initScores(self, assignment):
+        """
+        compute from scratch the number of true literals of every clause and the weighted make and break score of every variable for @param assignment
+        after this every self.flip on @param assignment keeps them up to date
+        the scores are weighted by self.score_weights, the unsatisfied weight by the instance weights self.weights
+        """
+        weights = self.weights
+        score_weights = self.score_weights
+        index_literals = self.index_literals
+        index_offsets = self.index_offsets
+        no_clauses = len(index_offsets)-1
+        # NOTE: the scores change on every flip and stay plain lists, reading and writing a list is cheaper than a typed array
+        true_count = [0] * no_clauses
+        true_sum = [0] * no_clauses
+        unsat_clauses = []
+        unsat_position = [-1] * no_clauses
+        unsat_weight = 0
+        break_score = [0] * self.no_vars
+        make_score = [0] * self.no_vars
+        for clause_i in xrange(no_clauses):
+            start, end = index_offsets[clause_i], index_offsets[clause_i+1]
+            if start == end:
+                if clause_i in self.tautologies:
+                    true_count[clause_i] = 1
+                    continue
+                # NOTE: an empty clause can never be satisfied
+                unsat_position[clause_i] = len(unsat_clauses)
+                unsat_clauses.append(clause_i)
+                unsat_weight += weights[clause_i]
+                continue
+            count = 0
+            var_sum = 0
+            for var in index_literals[start:end]:
+                if (var > 0) == assignment[abs(var)-1]:
+                    count += 1
+                    var_sum += abs(var)
+            true_count[clause_i] = count
+            true_sum[clause_i] = var_sum
+            if count == 0:
+                unsat_position[clause_i] = len(unsat_clauses)
+                unsat_clauses.append(clause_i)
+                unsat_weight += weights[clause_i]
+                for var in index_literals[start:end]:
+                    make_score[abs(var)-1] += score_weights[clause_i]
+            elif count == 1:
+                # NOTE: with a single true literal the sum of the true variables is that critical variable itself
+                break_score[var_sum-1] += score_weights[clause_i]
+        self.true_count = true_count
+        self.true_sum = true_sum
+        self.break_score = break_score
+        self.make_score = make_score
+        self.unsat_clauses = unsat_clauses
+        self.unsat_position = unsat_position
+        self.unsat_weight = unsat_weight
+        self.scored_assignment = assignment
+
+    def updateScores(self, var):
+        """
+        update the true literal counts, the make and break scores and the unsatisfied clauses
+        after @param var has been flipped in self.scored_assignment
+        only the clauses containing @param var are visited
+        """
+        var_i = abs(var)-1
+        var_id = var_i+1
+        true_count = self.true_count
+        true_sum = self.true_sum
+        break_score = self.break_score
+        make_score = self.make_score
+        index_literals = self.index_literals
+        index_offsets = self.index_offsets
+        unsat_clauses = self.unsat_clauses
+        unsat_position = self.unsat_position
+        weights = self.weights
+        score_weights = self.score_weights
+        positive = self.positive_clauses[self.positive_offsets[var_i]:self.positive_offsets[var_i+1]]
+        negative = self.negative_clauses[self.negative_offsets[var_i]:self.negative_offsets[var_i+1]]
+        if self.scored_assignment[var_i]:
+            gained, lost = positive, negative
+        else:
+            gained, lost = negative, positive
+
+        for clause_i in gained:
+            count = true_count[clause_i]
+            if count == 0:
+                weight = score_weights[clause_i]
+                for lit in index_literals[index_offsets[clause_i]:index_offsets[clause_i+1]]:
+                    make_score[abs(lit)-1] -= weight
+                break_score[var_i] += weight
+                self.unsat_weight -= weights[clause_i]
+                # NOTE: swap the last unsatisfied clause into the hole so removal stays O(1)
+                position = unsat_position[clause_i]
+                last_clause_i = unsat_clauses.pop()
+                if last_clause_i != clause_i:
+                    unsat_clauses[position] = last_clause_i
+                    unsat_position[last_clause_i] = position
+                unsat_position[clause_i] = -1
+            elif count == 1:
+                break_score[true_sum[clause_i]-1] -= score_weights[clause_i]
+            true_count[clause_i] = count+1
+            true_sum[clause_i] += var_id
+
+        # NOTE: the clauses broken by this flip are appended from here on, getRepairMove only looks at them
+        self.broken_from = len(unsat_clauses)
+        for clause_i in lost:
+            count = true_count[clause_i]-1
+            true_count[clause_i] = count
+            true_sum[clause_i] -= var_id
+            if count == 0:
+                weight = score_weights[clause_i]
+                for lit in index_literals[index_offsets[clause_i]:index_offsets[clause_i+1]]:
+                    make_score[abs(lit)-1] += weight
+                break_score[var_i] -= weight
+                self.unsat_weight += weights[clause_i]
+                unsat_position[clause_i] = len(unsat_clauses)
+                unsat_clauses.append(clause_i)
+            elif count == 1:
+                break_score[true_sum[clause_i]-1] += score_weights[clause_i]
+
+    def trueLiteralCount(self, clause_i, assignment):
+        """
+        the number of literals of the index clause @param clause_i which are true under @param assignment
+        """
+        count = 0
+        for var in self.index_literals[self.index_offsets[clause_i]:self.index_offsets[clause_i+1]]:
+            if (var > 0) == assignment[abs(var)-1]:
+                count += 1
+        return count
+
     def breakCount(self, assignment, var):
         """
-        The Number of currently satisfied Clauses in the self.cnf
+        The Number (total self.score_weights weight) of currently satisfied Clauses in the self.cnf
         which will become unsatisfied by @param assignment
         if we flipped the value of variable @param var.
         """
-        before_flip_assignment = assignment[:]
-        self.flip(assignment, var)
-        after_flip_assignment = assignment[:]
-        self.flip(assignment, var)
+        self.score_evaluations += 1
+        if assignment is self.scored_assignment:
+            return self.break_score[abs(var)-1]
 
+        # NOTE: fallback for an assignment which is not being tracked, only the clauses where var is the single true literal break
+        var_i = abs(var)-1
+        if assignment[var_i]:
+            clauses, offsets = self.positive_clauses, self.positive_offsets
+        else:
+            clauses, offsets = self.negative_clauses, self.negative_offsets
         break_count = 0
+        for clause_i in clauses[offsets[var_i]:offsets[var_i+1]]:
+            if self.trueLiteralCount(clause_i, assignment) == 1:
+                break_count += self.score_weights[clause_i]
+        return break_count
 
-        for clause in self.cnf:
-            if self.isClauseSatisfied(clause, before_flip_assignment) and not self.isClauseSatisfied(clause, after_flip_assignment):
-                break_count += 1
+    def makeCount(self, assignment, var):
+        """
+        The Number (total self.score_weights weight) of currently unsatisfied Clauses in the self.cnf
+        which will become satisfied by @param assignment
+        if we flipped the value of variable @param var.
+        """
+        if assignment is self.scored_assignment:
+            return self.make_score[abs(var)-1]
 
-        return break_count
+        # NOTE: only the clauses where the literal of var is false now can be unsatisfied
+        var_i = abs(var)-1
+        if assignment[var_i]:
+            clauses, offsets = self.negative_clauses, self.negative_offsets
+        else:
+            clauses, offsets = self.positive_clauses, self.positive_offsets
+        make_count = 0
+        for clause_i in clauses[offsets[var_i]:offsets[var_i+1]]:
+            if not self.trueLiteralCount(clause_i, assignment):
+                make_count += self.score_weights[clause_i]
+        return make_count
 
-    def getCompressedKey(self, assignment):
+    def countTried(self, key):
         """
-        get compressed key to check to avoid retried initial assignment with lower probabililty
+        count one more try of the initial assignment with the zobrist hash @param key and return how often it has been tried
+        only the RESTART_HISTORY_SIZE most recently tried hashes are remembered so the history never outgrows a long run
         """
-        key = []
-        prev = assignment[0]
-        count = 0
-        for each in assignment:
-            if prev == each:
-                count += 1
-            else:
-                key.append(('1' if not each else '0') + str(count))
-                count = 1
-                prev = each
-        if count:
-            key.append(('1' if each else '0') + str(count))
+        count = self.tried_count.pop(key, 0) + 1
+        self.tried_count[key] = count
+        if len(self.tried_count) > RESTART_HISTORY_SIZE:
+            self.tried_count.popitem(last=False)
+        return count
+
+    def randomTruthAssignment(self):
+        """
+        return a random truth assignment and its zobrist hash ie. the xor of the keys of its true variables
+        """
+        if not self.no_vars:
+            return bytearray(), 0
+        # NOTE: the bits of a single random long are the variables, both this and the xor fold run in C instead of a python loop per variable
+        assignment = bytearray(format(getrandbits(self.no_vars), '0{}b'.format(self.no_vars)).translate(BIT_VALUES))
+        return assignment, reduce(xor, compress(self.zobrist_keys, assignment), 0)
 
-        return '_'.join(key)
-        
     def randomInitialTruthAssignment(self):
         """
         get a initial random truth assignment
         """
         # NOTE: experimentational data with all true and all false assignment, aligns with logical inference of setting equal probability of true and false for the best result
         # as the steps to reach the maxima for the initial assignment will be lower in equi distributed true false assignment.
-        init = [random() > 0.5 for _ in range(self.no_vars)]
-        compressed_key = self.getCompressedKey(init)
-        self.tried_count[compressed_key] += 1
+        if self.resume_assignment is not None:
+            init, self.resume_assignment = self.resume_assignment, None
+            return init
+        if self.population > 1 and self.clause_var_index is not None:
+            return self.rankedInitialTruthAssignment()
+        init, key = self.randomTruthAssignment()
         max_attempts = 10
-        while max_attempts and 1.0/self.tried_count[compressed_key] < random():
+        while max_attempts and 1.0/self.countTried(key) < random():
             max_attempts -= 1
-            init = [random() > 0.5 for _ in range(self.no_vars)]
-            compressed_key = self.getCompressedKey(init)
-            self.tried_count[compressed_key] += 1
+            self.restart_retries += 1
+            init, key = self.randomTruthAssignment()
         return init
 
+    def rankedInitialTruthAssignment(self):
+        """
+        get a initial random truth assignment by generating self.population random assignments at once
+        and picking the one satisfying the most clauses which has not been tried too often already
+        """
+        candidates = np.random.random((self.population, self.no_vars)) > 0.5
+        counts = self.satisfiedCountBatch(candidates)
+        keys = np.frombuffer(self.zobrist_keys, dtype=np.uint)
+        max_attempts = 10
+        for candidate_i in np.argsort(-counts, kind='mergesort'):
+            key = int(np.bitwise_xor.reduce(keys[candidates[candidate_i]]))
+            if not max_attempts or 1.0/self.countTried(key) >= random():
+                break
+            max_attempts -= 1
+            self.restart_retries += 1
+        return bytearray(candidates[candidate_i].tostring())
+
     def satisfiedCount(self, assignment):
         """
         return the number of clauses satisfied of self.cnf by @param assignment
+        clauses merged by preprocessCNF count with their weight and the clauses it already decided as satisfied are included
         """
-        return sum([1 for clause in self.cnf if self.isClauseSatisfied(clause, assignment)])
+        # NOTE: scored_assignment is None between searches, a missing assignment must not pass for it
+        if assignment is not None and assignment is self.scored_assignment:
+            return self.satisfied_offset+self.total_weight-self.unsat_weight
+        if self.clause_var_index is not None:
+            return self.satisfied_offset+int(self.satisfiedCountBatch(assignment)[0])
+        return self.satisfied_offset+sum(weight for clause, weight in izip(self.cnf, self.weights) if self.isClauseSatisfied(clause, assignment))
 
     def objective_function(self, assignment):
         """
         the objective function guiding our search for an optimum solution with minimum value of objective function
+        ie. the total weight of the unsatisfied clauses of self.cnf
+        """
+        if assignment is not None and assignment is self.scored_assignment:
+            return self.unsat_weight
+        return self.satisfied_offset+self.total_weight-self.satisfiedCount(assignment)
+
+    def scoreCandidates(self, assignment, clause):
+        """
+        return the break counts of all the variables of @param clause for @param assignment in a single pass
+        getFreeMove and getGreedyClauseVar both choose from them so a move scores its clause only once
         """
-        return len(self.cnf)-self.satisfiedCount(assignment)
+        if assignment is self.scored_assignment:
+            self.score_evaluations += len(clause)
+            break_score = self.break_score
+            return [break_score[abs(var)-1] for var in clause]
+        return [self.breakCount(assignment, var) for var in clause]
 
-    def getFreeMove(self, clause, assignment):
+    def getFreeMove(self, clause, assignment, break_counts=None):
         """
         try and find a variable from @param clause such that its break count is 0
         such a move is free move as it flipping does'nt cost any unwanted side effect. 
+        @param break_counts are the scoreCandidates of @param clause if already computed
         """
-        for var in clause:
-            if self.breakCount(assignment, var) == 0:
+        if break_counts is None:
+            break_counts = self.scoreCandidates(assignment, clause)
+        for var, break_count in izip(clause, break_counts):
+            if break_count == 0:
                 return var
         return None
 
     def flip(self, assignment, var):
         """
         invert the value of @param var in the @param assignment
+        and keep the make and break scores up to date if @param assignment is the scored one
         """
         assignment[abs(var)-1] = not assignment[abs(var)-1]
+        if assignment is self.scored_assignment:
+            self.updateScores(var)
 
     def getRandomUnsatisfiedClause(self, assignment):
         """
         return with a uniform random distribution a random unsatisfied clause
+        for the scored assignment this is the slice of the clause in the flat index, no tuple is built
         """
+        if assignment is self.scored_assignment:
+            clause_i = self.unsat_clauses[int(random()*len(self.unsat_clauses))]
+            return self.index_literals[self.index_offsets[clause_i]:self.index_offsets[clause_i+1]]
         return sample([clause for clause in self.cnf if not self.isClauseSatisfied(clause, assignment)], 1)[0]
 
     def getRandomClauseVar(self, clause):
@@ -209,70 +1180,742 @@ class MAXSatSolver():
         """
         return sample(clause, 1)[0]
 
-    def getGreedyClauseVar(self, assignment, clause):
+    def getGreedyClauseVar(self, assignment, clause, break_counts=None):
         """
         return a var from @param claues such that flipping it reaps the maximum benefit
         ie. return a variable with the minimum break count
+        @param break_counts are the scoreCandidates of @param clause if already computed
         """
+        if break_counts is None:
+            break_counts = self.scoreCandidates(assignment, clause)
         min_break_count = float('inf')
         best_var = None
-        for var in clause:
-            break_count = self.breakCount(assignment, var)
+        for var, break_count in izip(clause, break_counts):
             if min_break_count > break_count:
                 best_var = abs(var)
                 min_break_count = break_count
         return best_var
 
+    def getRepairMove(self, var):
+        """
+        lookahead move after @param var was flipped in self.scored_assignment: return the variable of the clauses that flip broke
+        whose flip lowers the unsatisfied weight the most, None if none of them strictly lowers it
+        the make and break scores are exact after the flip so the gain of the two flips together is known without trying them
+        """
+        broken = self.unsat_clauses[self.broken_from:]
+        if not broken:
+            return None
+        make_score = self.make_score
+        break_score = self.break_score
+        index_literals = self.index_literals
+        index_offsets = self.index_offsets
+        var_id = abs(var)
+        best_var = None
+        best_score = 0
+        for clause_i in broken:
+            for lit in index_literals[index_offsets[clause_i]:index_offsets[clause_i+1]]:
+                lit_i = abs(lit)-1
+                score = make_score[lit_i] - break_score[lit_i]
+                if score > best_score and lit_i+1 != var_id:
+                    best_var = lit_i+1
+                    best_score = score
+        return best_var
+
+    def getRandomUnsatisfiedClauseIndex(self):
+        """
+        return with a uniform random distribution the index of a clause unsatisfied by self.scored_assignment
+        """
+        return self.unsat_clauses[int(random()*len(self.unsat_clauses))]
+
+    def getIndexClause(self, clause_i):
+        """
+        return the literals of the clause @param clause_i of the flat index
+        """
+        return self.index_literals[self.index_offsets[clause_i]:self.index_offsets[clause_i+1]]
+
+    def getWeightedMove(self, clause):
+        """
+        paws move: return the variable of @param clause whose flip lowers the weighted score of self.scored_assignment the most
+        ie. with the largest make - break, a move leaving the weighted score unchanged is only taken with probability self.paws_flat
+        None if there is no move to take
+        """
+        best_var = None
+        best_score = 0
+        flat_vars = []
+        for var in clause:
+            var_i = abs(var)-1
+            score = self.make_score[var_i] - self.break_score[var_i]
+            if score > best_score:
+                best_var = var
+                best_score = score
+            elif score == 0:
+                flat_vars.append(var)
+        self.score_evaluations += len(clause)
+        if best_var is None and flat_vars and random() < self.paws_flat:
+            return flat_vars[int(random()*len(flat_vars))]
+        return best_var
+
+    def increaseClauseWeight(self, clause_i):
+        """
+        paws weight increase: add one to the search weight of the unsatisfied clause @param clause_i
+        and after every self.paws_decrease_period increases take one off every raised weight with decreaseClauseWeights
+        """
+        if self.score_weights[clause_i] == self.weights[clause_i]:
+            self.penalized.append(clause_i)
+        self.score_weights[clause_i] += 1
+        # NOTE: an unsatisfied clause only counts in the make score of its variables
+        make_score = self.make_score
+        for var in self.getIndexClause(clause_i):
+            make_score[abs(var)-1] += 1
+        self.weight_increases += 1
+        if not self.weight_increases % self.paws_decrease_period:
+            self.decreaseClauseWeights()
+
+    def decreaseClauseWeights(self):
+        """
+        paws weight decrease: take one off the search weight of every clause weighted above its instance weight
+        """
+        score_weights = self.score_weights
+        weights = self.weights
+        make_score = self.make_score
+        break_score = self.break_score
+        true_count = self.true_count
+        true_sum = self.true_sum
+        index_literals = self.index_literals
+        index_offsets = self.index_offsets
+        penalized = []
+        for clause_i in self.penalized:
+            score_weights[clause_i] -= 1
+            count = true_count[clause_i]
+            if count == 0:
+                for var in index_literals[index_offsets[clause_i]:index_offsets[clause_i+1]]:
+                    make_score[abs(var)-1] -= 1
+            elif count == 1:
+                break_score[true_sum[clause_i]-1] -= 1
+            if score_weights[clause_i] > weights[clause_i]:
+                penalized.append(clause_i)
+        self.penalized = penalized
+
     def maxWalkSAT(self):
         """
         a walkSAT based max SAT solver
         """
         init = time()
         timeout = time() + self.timeout_duration_sec
+        self.search_start = init
+        self.next_stats = init + self.stats_interval if self.stats_callback or self.stats_path else float('inf')
+        self.next_report = min(self.next_stats, self.next_checkpoint)
+        # NOTE: a search left without time has nothing to stall on, it only draws its initial assignment
+        self.stall_sec = self.stall_fraction * self.timeout_duration_sec if self.stall_fraction and self.timeout_duration_sec > 0 else float('inf')
+        self.stall_deadline = init + self.stall_sec
         retry_i = 1
-        while time() < timeout:
-            curr_assignment = self.randomInitialTruthAssignment()
-            retry_i += 1
-    
-            if not self.best_assignment:
-                self.best_assignment = curr_assignment[:]
-            
-            for flip_i in range(self.max_flips):
-                if time() > timeout: break
-                if self.objective_function(curr_assignment) == 0:
-                    self.objective_function(curr_assignment)
-                    self.best_assignment = curr_assignment[:]
-                    if self.log:
-                        print "%2.6f" % (time()-init), "\t",self.satisfiedCount(curr_assignment), "\t\t\t",retry_i, "\t\t",flip_i
-                    return self.best_assignment
+        journal = self.best_journal
+        try:
+            # NOTE: a search left without time by the preprocessing still draws one initial assignment to have a best
+            while time() < timeout or self.best_objective is None:
+                # NOTE: the assignment of the last restart is dropped, so the best it holds is repaired in place instead of copied
+                self.getBest()
+                if self.best_objective is not None and self.isStalled():
+                    self.stalled = True
+                    break
+                restart_init = time()
+                curr_assignment = self.randomInitialTruthAssignment()
+                self.initScores(curr_assignment)
+                self.restart_time += time() - restart_init
+                retry_i += 1
+                self.restarts += 1
+                repair_var = None
+                chain = 0
+        
+                if self.best_objective is None:
+                    self.saveBest(curr_assignment, init, live=True)
+                
+                for flip_i in xrange(self.max_flips):
+                    now = time()
+                    if now > timeout or now > self.stall_deadline: break
+                    # NOTE: next_report is infinite when snapshots and checkpoints are off so this costs a single comparison per flip
+                    if now >= self.next_report:
+                        self.reportProgress()
+                    # NOTE: curr_assignment is the scored assignment, its objective is self.unsat_weight without a call per flip
+                    if self.unsat_weight == 0:
+                        self.saveBest(curr_assignment, init, live=True)
+                        if self.log:
+                            print "%2.6f" % (time()-init), "\t",self.satisfiedCount(curr_assignment), "\t\t\t",retry_i, "\t\t",flip_i
+                        self.reportStats(final=True)
+                        return self.getBest()
             
-                clause = self.getRandomUnsatisfiedClause(curr_assignment)
-
-                var_id = self.getFreeMove(clause, curr_assignment)
-                if not var_id:
-                    if random() < self.noise:
-                        var_id = self.getRandomClauseVar(clause)
+                    if repair_var is not None:
+                        var_id = repair_var
+                        self.lookahead_moves += 1
+                    elif self.engine == 'paws':
+                        clause_i = self.getRandomUnsatisfiedClauseIndex()
+                        var_id = self.getWeightedMove(self.getIndexClause(clause_i))
+                        if var_id is None:
+                            # NOTE: no variable of the clause lowers the weighted score, raise its weight instead of flipping
+                            self.increaseClauseWeight(clause_i)
+                            continue
+                        self.greedy_moves += 1
                     else:
-                        var_id = self.getGreedyClauseVar(curr_assignment, clause)
-
-                # NOTE: this is the case to handle if the first random initial assignment has a more clauses satisfied before fliping
-                # observer in the 'cnf': [(1, 2, 3), (-2, -1, 3), (1, -3, 2), (1, 2, -3), (1, -2, -3), (2, -3, 1), (-3, 1, -2), (-2, 3, -1), (-3, -1, -2), (-1, -2, 3), (2, -3, 1), (-1, -2, 3), (2, -1, -3), (-3, 1, 2), (2, 3, -1), (1, 3, -2), (3, -2, 1), (2, 3, 1), (-1, -3, -2), (-2, 3, 1), (-2, 1, 3), (1, 2, 3), (-3, 2, 1), (-3, -2, 1), (-1, 3, -2), (2, 3, -1), (-2, -3, 1), (-2, -1, 3), (-2, 1, 3), (-2, -3, -1), (2, -3, 1), (-1, -3, 2), (-1, 2, 3), (-3, -1, 2), (-2, 1, -3), (-1, -2, 3), (-2, -3, -1), (3, -1, 2), (-2, 3, 1), (-2, 1, -3), (2, -3, -1), (3, -2, -1), (-1, -3, -2), (-1, 2, 3), (-2, 1, 3), (1, -3, -2), (2, 1, -3), (-3, -1, 2), (-3, -2, 1), (-3, -1, -2), (2, 1, -3), (1, 3, 2), (1, -2, 3), (-3, 2, -1), (1, -2, 3), (-1, 2, -3), (-2, -1, 3), (-3, 1, -2), (-2, 3, 1), (-1, -2, -3), (2, 3, 1), (-2, 1, -3), (-2, -1, -3), (2, 1, -3), (-2, -1, 3), (1, 2, -3), (-1, -2, 3), (-3, -2, -1), (-2, -1, -3), (2, 3, 1), (1, -3, -2), (-1, 2, 3), (-1, -3, 2), (-1, -3, 2), (3, 1, 2), (-2, -1, 3), (3, -1, -2), (-1, -3, -2), (-1, 3, -2), (2, -3, -1), (1, 3, 2), (3, -1, -2), (2, 3, 1), (2, 1, -3), (2, -1, 3), (3, 2, 1), (-1, -3, 2), (-3, 2, 1), (-1, -3, -2), (-2, 3, -1), (2, -1, -3), (3, -1, 2), (-3, 2, 1), (3, -2, -1), (-1, -3, -2), (2, -1, -3), (-3, 2, -1), (-3, 2, 1), (-1, 3, 2), (-3, -2, 1)]
-                # with [True, False, False] giving 91 satisfied clauses where [False, False, False] gives 90 satisfied clauses
-                if flip_i == 0 and self.objective_function(curr_assignment) < self.objective_function(self.best_assignment):
-                    if self.log:
-                        print "%2.6f" % (time()-init), "\t",self.satisfiedCount(curr_assignment), "\t\t\t",retry_i, "\t\t",flip_i
-                        # print('retry_i: {} flip_i: {} prev_clauses_satisfied: {} new_clauses_satisfied: {}'.format(retry_i, flip_i, self.satisfiedCount(self.best_assignment), self.satisfiedCount(curr_assignment)))
-                    self.best_assignment = curr_assignment[:]
-
-                self.flip(curr_assignment, var_id)
-                if self.objective_function(curr_assignment) < self.objective_function(self.best_assignment):
-                    if self.log:
-                        print "%2.6f" % (time()-init), "\t",self.satisfiedCount(curr_assignment), "\t\t\t",retry_i, "\t\t",flip_i
-                        # print('retry_i: {} flip_i: {} prev_clauses_satisfied: {} new_clauses_satisfied: {}'.format(retry_i, flip_i, self.satisfiedCount(self.best_assignment), self.satisfiedCount(curr_assignment)))
-                    self.best_assignment = curr_assignment[:]
+                        clause = self.getRandomUnsatisfiedClause(curr_assignment)
+                        break_counts = self.scoreCandidates(curr_assignment, clause)
+                        var_id = self.getFreeMove(clause, curr_assignment, break_counts)
+                        if var_id:
+                            self.free_moves += 1
+                        elif random() < self.noise:
+                            self.random_moves += 1
+                            var_id = self.getRandomClauseVar(clause)
+                        else:
+                            self.greedy_moves += 1
+                            var_id = self.getGreedyClauseVar(curr_assignment, clause, break_counts)
+                            chain = self.lookahead-1
+
+                    # NOTE: this is the case to handle if the first random initial assignment has a more clauses satisfied before fliping
+                    # observer in the 'cnf': [(1, 2, 3), (-2, -1, 3), (1, -3, 2), (1, 2, -3), (1, -2, -3), (2, -3, 1), (-3, 1, -2), (-2, 3, -1), (-3, -1, -2), (-1, -2, 3), (2, -3, 1), (-1, -2, 3), (2, -1, -3), (-3, 1, 2), (2, 3, -1), (1, 3, -2), (3, -2, 1), (2, 3, 1), (-1, -3, -2), (-2, 3, 1), (-2, 1, 3), (1, 2, 3), (-3, 2, 1), (-3, -2, 1), (-1, 3, -2), (2, 3, -1), (-2, -3, 1), (-2, -1, 3), (-2, 1, 3), (-2, -3, -1), (2, -3, 1), (-1, -3, 2), (-1, 2, 3), (-3, -1, 2), (-2, 1, -3), (-1, -2, 3), (-2, -3, -1), (3, -1, 2), (-2, 3, 1), (-2, 1, -3), (2, -3, -1), (3, -2, -1), (-1, -3, -2), (-1, 2, 3), (-2, 1, 3), (1, -3, -2), (2, 1, -3), (-3, -1, 2), (-3, -2, 1), (-3, -1, -2), (2, 1, -3), (1, 3, 2), (1, -2, 3), (-3, 2, -1), (1, -2, 3), (-1, 2, -3), (-2, -1, 3), (-3, 1, -2), (-2, 3, 1), (-1, -2, -3), (2, 3, 1), (-2, 1, -3), (-2, -1, -3), (2, 1, -3), (-2, -1, 3), (1, 2, -3), (-1, -2, 3), (-3, -2, -1), (-2, -1, -3), (2, 3, 1), (1, -3, -2), (-1, 2, 3), (-1, -3, 2), (-1, -3, 2), (3, 1, 2), (-2, -1, 3), (3, -1, -2), (-1, -3, -2), (-1, 3, -2), (2, -3, -1), (1, 3, 2), (3, -1, -2), (2, 3, 1), (2, 1, -3), (2, -1, 3), (3, 2, 1), (-1, -3, 2), (-3, 2, 1), (-1, -3, -2), (-2, 3, -1), (2, -1, -3), (3, -1, 2), (-3, 2, 1), (3, -2, -1), (-1, -3, -2), (2, -1, -3), (-3, 2, -1), (-3, 2, 1), (-1, 3, 2), (-3, -2, 1)]
+                    # with [True, False, False] giving 91 satisfied clauses where [False, False, False] gives 90 satisfied clauses
+                    if flip_i == 0 and self.unsat_weight < self.best_objective:
+                        if self.log:
+                            print "%2.6f" % (time()-init), "\t",self.satisfiedCount(curr_assignment), "\t\t\t",retry_i, "\t\t",flip_i
+                            # print('retry_i: {} flip_i: {} prev_clauses_satisfied: {} new_clauses_satisfied: {}'.format(retry_i, flip_i, self.satisfiedCount(self.best_assignment), self.satisfiedCount(curr_assignment)))
+                        self.saveBest(curr_assignment, init, live=True)
+
+                    self.flip(curr_assignment, var_id)
+                    self.flips += 1
+                    if self.best_source is curr_assignment:
+                        journal.append(var_id)
+                        # NOTE: without a restart (paws) nothing truncates the journal, once replaying it costs more than a copy the best is copied
+                        if len(journal) > self.no_vars:
+                            self.best_assignment = self.getBest(copy=True)
+                            self.best_source = None
+                            del journal[:]
+                    if self.unsat_weight < self.best_objective:
+                        if self.log:
+                            print "%2.6f" % (time()-init), "\t",self.satisfiedCount(curr_assignment), "\t\t\t",retry_i, "\t\t",flip_i
+                            # print('retry_i: {} flip_i: {} prev_clauses_satisfied: {} new_clauses_satisfied: {}'.format(retry_i, flip_i, self.satisfiedCount(self.best_assignment), self.satisfiedCount(curr_assignment)))
+                        self.saveBest(curr_assignment, init, live=True)
+                    # NOTE: the next flips of a lookahead move repair the clauses broken by this one, each counts as a flip of its own
+                    repair_var = None
+                    if chain:
+                        chain -= 1
+                        repair_var = self.getRepairMove(var_id)
+                        if repair_var is None:
+                            chain = 0
+
+
+            self.reportStats(final=True)
+            return self.getBest()
+        finally:
+            # NOTE: also on ^C so the caller always finds the best in self.best_assignment
+            self.getBest()
+
+    def resetStats(self):
+        """
+        reset the counters and timers of the search reported by getStats
+        """
+        self.search_start = time()
+        self.time_to_best = None
+        self.restarts = 0
+        self.flips = 0
+        self.free_moves = 0
+        self.random_moves = 0
+        self.greedy_moves = 0
+        self.score_evaluations = 0
+        self.restart_retries = 0
+        self.improvements = 0
+        self.restart_time = 0.0
+        self.exact_nodes = 0
+        self.weight_increases = 0
+        self.lookahead_moves = 0
+        self.proven_optimal = False
+        self.stalled = False
+        self.stall_sec = float('inf')
+        self.stall_deadline = float('inf')
+        self.restarts_at_best = 0
+
+    def getStats(self):
+        """
+        return a dict with the counters and timers of the current search
+        restart_time is spent drawing and scoring initial assignments, flip_time is the rest of the search
+        """
+        elapsed = time() - self.search_start
+        return {
+            'elapsed': elapsed,
+            'restarts': self.restarts,
+            'flips': self.flips,
+            'flips_per_sec': self.flips / elapsed if elapsed > 0 else 0.0,
+            'free_moves': self.free_moves,
+            'random_moves': self.random_moves,
+            'greedy_moves': self.greedy_moves,
+            'score_evaluations': self.score_evaluations,
+            'restart_retries': self.restart_retries,
+            'improvements': self.improvements,
+            'restart_time': self.restart_time,
+            'flip_time': elapsed - self.restart_time,
+            'best_satisfied': None if self.best_objective is None else self.satisfied_offset + self.total_weight - self.best_objective,
+            'time_to_best': self.time_to_best,
+            'exact_nodes': self.exact_nodes,
+            'weight_increases': self.weight_increases,
+            'lookahead_moves': self.lookahead_moves,
+            'proven_optimal': self.proven_optimal,
+            'stalled': self.stalled,
+        }
+
+    def reportStats(self, final=False):
+        """
+        hand a getStats snapshot to self.stats_callback and write it to self.stats_path, then schedule the next one
+        @param final forces the snapshot at the end of a search even if it is not due yet
+        """
+        if not (self.stats_callback or self.stats_path):
+            return
+        stats = self.getStats()
+        stats['final'] = final
+        if self.stats_callback:
+            self.stats_callback(stats)
+        if self.stats_path:
+            with open(self.stats_path + '.tmp', 'w') as file:
+                json.dump(stats, file)
+            os.rename(self.stats_path + '.tmp', self.stats_path)
+        self.next_stats = time() + self.stats_interval
+
+    def reportProgress(self):
+        """
+        take the stats snapshot and write the checkpoint which are due, then schedule the next check of the search loop
+        """
+        now = time()
+        if now >= self.next_stats:
+            self.reportStats()
+        if now >= self.next_checkpoint:
+            self.writeCheckpoint()
+        self.next_report = min(self.next_stats, self.next_checkpoint)
+
+    def getInstanceKey(self):
+        """
+        return a hash of self.no_vars and the clauses of self.cnf identifying the instance of a checkpoint
+        """
+        cnf = self.cnf if isinstance(self.cnf, FlatCNF) else FlatCNF.fromClauses(self.cnf)
+        key = hashlib.md5(str(self.no_vars))
+        key.update(cnf.literals.tostring())
+        key.update(cnf.offsets.tostring() if cnf.offsets is not None else str(cnf.width))
+        return key.hexdigest()
+
+    def getCheckpointPath(self):
+        """
+        return the path of the checkpoint of the instance being searched in self.checkpoint_dir
+        """
+        return os.path.join(self.checkpoint_dir, self.instance_key + '.json')
+
+    def writeCheckpoint(self):
+        """
+        store the best assignment so far of the original variables, the search counters and the random generator states
+        in the checkpoint of the instance being searched, then schedule the next one
+        """
+        self.next_checkpoint = time() + self.checkpoint_interval
+        if self.best_objective is None:
+            return
+        assignment = self.getOriginalAssignment(self.getBest(copy=True))
+        checkpoint = {
+            'instance': self.instance_key,
+            'no_vars': len(assignment),
+            'satisfied': self.satisfied_offset + self.total_weight - self.best_objective,
+            'time_to_best': self.time_to_best,
+            'restarts': self.restarts,
+            'flips': self.flips,
+            'improvements': self.improvements,
+            'assignment': [var_i+1 if value else -(var_i+1) for var_i, value in enumerate(assignment)],
+            'random_state': getstate(),
+            'numpy_random_state': None,
+        }
+        if np is not None:
+            state = np.random.get_state()
+            checkpoint['numpy_random_state'] = (state[0], state[1].tolist()) + state[2:]
+        if not os.path.isdir(self.checkpoint_dir):
+            os.makedirs(self.checkpoint_dir)
+        checkpoint_path = self.getCheckpointPath()
+        # NOTE: write to a temporary file and rename so a run killed while writing keeps its previous checkpoint
+        with open(checkpoint_path + '.tmp', 'w') as file:
+            json.dump(checkpoint, file)
+        os.rename(checkpoint_path + '.tmp', checkpoint_path)
+
+    def resumeCheckpoint(self):
+        """
+        continue from the checkpoint of the instance being searched: its assignment becomes the best so far and the first
+        initial assignment, and the search counters and random generator states are restored
+        a no-op if the instance has no checkpoint yet
+        """
+        checkpoint_path = self.getCheckpointPath()
+        if not os.path.exists(checkpoint_path):
+            return
+        with open(checkpoint_path) as file:
+            checkpoint = json.load(file)
+        self.resumeAssignment(bytearray(literal > 0 for literal in checkpoint['assignment']))
+        self.restarts = self.restarts_at_best = checkpoint['restarts']
+        self.flips = checkpoint['flips']
+        self.improvements = checkpoint['improvements']
+        version, state, gauss = checkpoint['random_state']
+        setstate((version, tuple(state), gauss))
+        if np is not None and checkpoint['numpy_random_state'] is not None:
+            state = checkpoint['numpy_random_state']
+            np.random.set_state((str(state[0]), np.array(state[1], dtype=np.uint32)) + tuple(state[2:]))
+        if self.log:
+            print('resumed from {} satisfied: {} restarts: {} flips: {}'.format(
+                checkpoint_path, self.satisfiedCount(self.best_assignment), self.restarts, self.flips))
+
+    def resumeAssignment(self, original):
+        """
+        make the assignment @param original of the cnf before preprocessCNF the best so far and the first initial assignment of the search
+        """
+        self.resume_assignment = self.getSearchAssignment(original)
+        self.best_assignment = bytearray(self.resume_assignment)
+        self.best_objective = self.objective_function(self.best_assignment)
+        self.time_to_best = 0.0
+
+    def isStalled(self):
+        """
+        True if the best assignment has not improved for self.stall_restarts restarts or self.stall_fraction of the timeout
+        """
+        if self.stall_restarts and self.restarts - self.restarts_at_best >= self.stall_restarts:
+            return True
+        return time() > self.stall_deadline
+
+    def saveBest(self, assignment, init, live=False):
+        """
+        record a copy of @param assignment as the best assignment so far, @param init is the time the search started
+        with @param live the assignment keeps being flipped by the search, it is only referenced instead of copied
+        and the flips appended to self.best_journal from now on are undone by getBest when the best is needed
+        """
+        if live:
+            self.best_source = assignment
+            del self.best_journal[:]
+        else:
+            self.best_assignment = bytearray(assignment)
+            self.best_source = None
+        self.best_objective = self.objective_function(assignment)
+        self.time_to_best = time() - init
+        self.improvements += 1
+        self.restarts_at_best = self.restarts
+        self.stall_deadline = time() + self.stall_sec
+        self.publishBest(force=self.best_objective == 0)
+        if self.improvement_callback:
+            # NOTE: a live assignment has no journaled flips right after being saved so it can be mapped as is
+            self.improvement_callback(self.time_to_best, self.satisfied_offset + self.total_weight - self.best_objective,
+                                      self.getOriginalAssignment(assignment))
+
+    def getBest(self, copy=False):
+        """
+        return the best assignment, first undoing on the live assignment saved by saveBest the flips journaled since
+        the live assignment is repaired in place and becomes self.best_assignment, with @param copy it is left to the search
+        and a repaired copy is returned instead
+        """
+        source = self.best_source
+        if source is None:
+            return self.best_assignment
+        best = bytearray(source) if copy else source
+        for var in self.best_journal:
+            var_i = abs(var)-1
+            best[var_i] = not best[var_i]
+        if copy:
+            return best
+        if best is self.scored_assignment:
+            self.scored_assignment = None
+        self.best_assignment = best
+        self.best_source = None
+        del self.best_journal[:]
+        return best
 
+    def exactSearch(self):
+        """
+        exact mode: a short walkSAT run gives the upper bound, exactMaxSAT then proves or improves it within the remaining time
+        the walkSAT run stops early once it stalls, see EXACT_WALK_STALL_RESTARTS
+        """
+        init = time()
+        timeout_duration_sec = self.timeout_duration_sec
+        stall_restarts, stall_fraction = self.stall_restarts, self.stall_fraction
+        self.timeout_duration_sec = min(timeout_duration_sec, self.exact_walk_sec)
+        if self.engine != 'paws':
+            self.stall_restarts = min(stall_restarts or EXACT_WALK_STALL_RESTARTS, EXACT_WALK_STALL_RESTARTS)
+        self.stall_fraction = min(stall_fraction or EXACT_WALK_STALL_FRACTION, EXACT_WALK_STALL_FRACTION)
+        try:
+            if self.workers > 1:
+                self.portfolioWalkSAT()
+            else:
+                self.maxWalkSAT()
+        finally:
+            self.timeout_duration_sec = timeout_duration_sec
+            self.stall_restarts, self.stall_fraction = stall_restarts, stall_fraction
+        # NOTE: a stalled warm up only hands over to the branch and bound, it does not make the search stalled
+        self.stalled = False
+        if self.best_objective == 0:
+            self.proven_optimal = True
+        else:
+            self.proven_optimal = self.exactMaxSAT(init + timeout_duration_sec, init)
         return self.best_assignment
 
+    def exactMaxSAT(self, deadline, init):
+        """
+        branch and bound over the variables of self.cnf with self.best_assignment as the starting upper bound
+        every improvement is saved with self.saveBest, @param init is the time the search started
+
+        the lower bound of a node is the weight of the clauses already falsified plus, for every unassigned variable x,
+        the smaller of the weights of the clauses reduced to the unit (x) and to the unit (-x), one of the two sides has to be falsified
+
+        return True if the whole tree was searched ie. self.best_assignment is optimal, False if @param deadline came first
+        """
+        no_vars = self.no_vars
+        clauses = self.cnf
+        weights = self.weights
+        positive = [[] for _ in range(no_vars)]
+        negative = [[] for _ in range(no_vars)]
+        for clause_i, clause in enumerate(clauses):
+            for var in set(clause):
+                (positive if var > 0 else negative)[abs(var)-1].append(clause_i)
+
+        values = [None] * no_vars
+        free = [len(set(clause)) for clause in clauses]
+        true_count = [0] * len(clauses)
+        unit_positive = [0] * no_vars
+        unit_negative = [0] * no_vars
+        # NOTE: state holds the falsified weight, the unit conflict bound and the best cost, lists as python 2 has no nonlocal
+        state = [0, 0, self.best_objective]
+
+        def addUnit(literal, weight):
+            var_i = abs(literal)-1
+            before = min(unit_positive[var_i], unit_negative[var_i])
+            if literal > 0:
+                unit_positive[var_i] += weight
+            else:
+                unit_negative[var_i] += weight
+            state[1] += min(unit_positive[var_i], unit_negative[var_i]) - before
+
+        def freeLiteral(clause_i):
+            for literal in clauses[clause_i]:
+                if values[abs(literal)-1] is None:
+                    return literal
+
+        for clause_i, clause in enumerate(clauses):
+            if free[clause_i] == 0:
+                state[0] += weights[clause_i]
+            elif free[clause_i] == 1:
+                addUnit(clause[0], weights[clause_i])
+
+        def assign(var_i, value):
+            values[var_i] = value
+            true_literal = var_i+1 if value else -(var_i+1)
+            for clause_i in (positive if value else negative)[var_i]:
+                if true_count[clause_i] == 0 and free[clause_i] == 1:
+                    addUnit(true_literal, -weights[clause_i])
+                true_count[clause_i] += 1
+                free[clause_i] -= 1
+            for clause_i in (negative if value else positive)[var_i]:
+                free[clause_i] -= 1
+                if true_count[clause_i] == 0:
+                    if free[clause_i] == 0:
+                        addUnit(-true_literal, -weights[clause_i])
+                        state[0] += weights[clause_i]
+                    elif free[clause_i] == 1:
+                        addUnit(freeLiteral(clause_i), weights[clause_i])
+
+        def unassign(var_i, value):
+            true_literal = var_i+1 if value else -(var_i+1)
+            for clause_i in reversed((negative if value else positive)[var_i]):
+                if true_count[clause_i] == 0:
+                    if free[clause_i] == 0:
+                        state[0] -= weights[clause_i]
+                        addUnit(-true_literal, weights[clause_i])
+                    elif free[clause_i] == 1:
+                        addUnit(freeLiteral(clause_i), -weights[clause_i])
+                free[clause_i] += 1
+            for clause_i in reversed((positive if value else negative)[var_i]):
+                true_count[clause_i] -= 1
+                free[clause_i] += 1
+                if true_count[clause_i] == 0 and free[clause_i] == 1:
+                    addUnit(true_literal, weights[clause_i])
+            values[var_i] = None
+
+        # NOTE: branch on the heaviest variables first and try the value of the best assignment first
+        order = sorted(range(no_vars), key=lambda var_i: -sum(weights[clause_i] for clause_i in positive[var_i] + negative[var_i]))
+        incumbent = self.best_assignment
+
+        class Timeout(Exception):
+            pass
+
+        def branch(depth):
+            self.exact_nodes += 1
+            if not self.exact_nodes & 1023 and time() > deadline:
+                raise Timeout()
+            if state[0] + state[1] >= state[2]:
+                return
+            if depth == no_vars:
+                state[2] = state[0]
+                self.saveBest(values, init)
+                return
+            var_i = order[depth]
+            # NOTE: a variable whose clauses are all satisfied already does not need its second branch
+            open_clauses = any(true_count[clause_i] == 0 for clause_i in positive[var_i]) or any(true_count[clause_i] == 0 for clause_i in negative[var_i])
+            for value in ((incumbent[var_i], not incumbent[var_i]) if open_clauses else (incumbent[var_i],)):
+                assign(var_i, value)
+                branch(depth+1)
+                unassign(var_i, value)
+
+        try:
+            branch(0)
+        except Timeout:
+            return False
+        return True
+
+    def portfolioWalkSAT(self):
+        """
+        run maxWalkSAT in self.workers processes, each with its own seed and optionally its own noise and max_flips
+        the workers publish their improvements to a shared best so far which is returned on timeout, interrupt or optimum
+        """
+        lock = Lock()
+        best_objective = Value('l', self.total_weight+1, lock=False)
+        best_values = Array('b', self.no_vars, lock=False)
+        self.shared_best = (lock, best_objective, best_values)
+        workers = []
+        for worker_i in range(self.workers):
+            worker_seed = None if self.random_seed is None else self.random_seed + worker_i
+            noise = self.portfolio_noise[worker_i % len(self.portfolio_noise)] if self.portfolio_noise else self.noise
+            max_flips = self.portfolio_max_flips[worker_i % len(self.portfolio_max_flips)] if self.portfolio_max_flips else self.max_flips
+            worker = Process(target=_portfolioWorker, args=(self, worker_i, worker_seed, noise, max_flips))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+
+        init = time()
+        timeout = init + self.timeout_duration_sec
+        try:
+            while time() < timeout and best_objective.value != 0 and any(worker.is_alive() for worker in workers):
+                sleep(0.05)
+                self.takeSharedBest(init)
+                if time() >= self.next_checkpoint:
+                    self.writeCheckpoint()
+            if best_objective.value != 0:
+                grace = time() + PORTFOLIO_GRACE_SEC
+                for worker in workers:
+                    worker.join(max(0, grace - time()))
+        finally:
+            # NOTE: holding the lock while terminating guarantees no worker is killed half way through publishing an assignment
+            lock.acquire()
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+                worker.join()
+            lock.release()
+            self.takeSharedBest(init)
+            self.shared_best = None
+            # NOTE: workers only give up before the timeout without an optimum when they stalled
+            self.stalled = self.best_objective != 0 and time() < timeout
+        return self.best_assignment
+
+    def takeSharedBest(self, init):
+        """
+        save the shared best of the portfolio workers as the best assignment if it beats it, @param init is the time the search started
+        """
+        lock, best_objective, best_values = self.shared_best
+        # NOTE: the unlocked read only filters out the common case, the comparison is repeated under the lock
+        if self.best_objective is not None and best_objective.value >= self.best_objective:
+            return
+        with lock:
+            if best_objective.value > self.total_weight or self.best_objective is not None and best_objective.value >= self.best_objective:
+                return
+            assignment = bytearray(best_values)
+        self.saveBest(assignment, init)
+
+    def publishBest(self, force=False):
+        """
+        share self.best_assignment with the other portfolio workers if it beats the shared best so far
+        at most once every PUBLISH_INTERVAL_SEC unless @param force, a no-op outside of portfolioWalkSAT
+        """
+        if self.shared_best is None or not (force or time() >= self.next_publish):
+            return
+        self.next_publish = time() + PUBLISH_INTERVAL_SEC
+        lock, best_objective, best_values = self.shared_best
+        # NOTE: the unlocked read only filters out the common case, the comparison is repeated under the lock
+        if self.best_objective >= best_objective.value:
+            return
+        with lock:
+            if self.best_objective < best_objective.value:
+                best_values[:] = self.getBest(copy=True)
+                best_objective.value = self.best_objective
+
+
+def _portfolioWorker(solver, worker_i, worker_seed, noise, max_flips):
+    """
+    entry point of the portfolio worker @param worker_i process forked from portfolioWalkSAT
+    """
+    # NOTE: ^C is handled by the parent which stops the workers and reports the shared best
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    solver.seedRandom(worker_seed)
+    solver.noise = noise
+    solver.max_flips = max_flips
+    # NOTE: the parent adopts the shared best, it alone reports the improvements and writes the checkpoints
+    solver.improvement_callback = None
+    solver.checkpoint_dir = None
+    solver.next_checkpoint = float('inf')
+    if solver.stats_path:
+        # NOTE: every worker keeps its own snapshot file next to the requested one
+        solver.stats_path = '{}.{}'.format(solver.stats_path, worker_i)
+    solver.maxWalkSAT()
+    solver.publishBest(force=True)
+
+
+def _ignoreInterrupt():
+    """
+    initializer of the solveCNFFilesBatch pool processes, ^C is handled by the parent
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _nextResult(results):
+    """
+    wait for the next result of a pool imap iterator @param results
+    """
+    # NOTE: a wait without timeout can not be interrupted by ^C on python 2
+    while True:
+        try:
+            return results.next(0.5)
+        except TimeoutError:
+            pass
+
+
+def _batchWorker(args):
+    """
+    solve a single problem file inside a solveCNFFilesBatch pool process and return its json record
+    """
+    solver, file_name = args
+    record = {'file': os.path.abspath(file_name)}
+    try:
+        init = time()
+        # NOTE: pool processes are daemonic and can not fork a portfolio of their own
+        solver.workers = 1
+        if solver.stats_path:
+            solver.stats_path = '{}.{}'.format(solver.stats_path, os.path.basename(file_name))
+        solver.seedRandom(solver.random_seed)
+        solver.loadCNFFile(file_name)
+        solver._search()
+        record.update({
+            'no_vars': solver.no_vars,
+            'no_literals_clause': solver.no_literals_clause,
+            'no_clauses': solver.no_clauses,
+            'satisfied': solver.satisfiedCount(solver.best_assignment),
+            'time_to_best': solver.time_to_best,
+            'time': time() - init,
+            'restarts': solver.restarts,
+            'flips': solver.flips,
+            'proven_optimal': solver.proven_optimal,
+            'stats': solver.getStats(),
+            'assignment': [var_i+1 if value else -(var_i+1) for var_i, value in enumerate(solver.best_assignment)],
+        })
+    except Exception as err:
+        record['error'] = str(err)
+    return record
+
+
+def parseList(value, type):
+    """
+    parse a comma separated command line value into a list of @param type
+    """
+    return [type(each) for each in value.split(',') if each.strip()]
+
 
 def main():
     parser = argparse.ArgumentParser(description="Solve all MAX-SAT problem in the directory given by path as argument")
@@ -286,19 +1929,56 @@ def main():
     optional.add_argument('-p', "--noise", help="noise probability of random move", required=False, type=float, default=0.1)
     optional.add_argument('-m', "--max_flips", help="max flips allowed for each try", required=False, type=int, default=1000)
     optional.add_argument('-v', "--verbose", help="log each improvement step with extra info", required=False, type=bool, default=False)
+    optional.add_argument("--population", help="number of random initial assignments ranked together on each restart (needs numpy)", required=False, type=int, default=1)
+    optional.add_argument('-c', "--cache_dir", help="directory to keep a binary cache of the parsed problem files in, re-runs skip the text parsing", required=False, default=None)
+    optional.add_argument('-w', "--workers", help="number of processes searching each problem in parallel, or solving problem files in parallel with -o", required=False, type=int, default=1)
+    optional.add_argument('-o', "--results_path", help="solve the directory as a batch writing one json record per problem file to this file, resuming the problem files already in it", required=False, default=None)
+    optional.add_argument("--portfolio_noise", help="comma separated noise values given round robin to the workers", required=False, type=lambda value: parseList(value, float), default=None)
+    optional.add_argument("--portfolio_max_flips", help="comma separated max flips values given round robin to the workers (walksat engine only)", required=False, type=lambda value: parseList(value, int), default=None)
+    optional.add_argument('-s', "--seed", help="seed of the random generators, worker i uses seed + i", required=False, type=int, default=None)
+    optional.add_argument("--stats_path", help="json file overwritten with the search counters and timers every --stats_interval seconds, "
+                          "with -w > 1 portfolio worker i writes FILE.i instead and with -o every problem file writes FILE.<problem file name>", required=False, default=None)
+    optional.add_argument("--stats_interval", help="seconds between two search stats snapshots", required=False, type=float, default=5.0)
+    optional.add_argument('-e', "--exact", help="prove the optimum by branch and bound on problems with at most --exact_max_vars variables", required=False, action='store_true')
+    optional.add_argument("--exact_max_vars", help="largest number of (preprocessed) variables solved exactly", required=False, type=int, default=64)
+    optional.add_argument("--exact_walk_sec", help="longest walkSAT run before the branch and bound to get an upper bound, it stops earlier once it stalls", required=False, type=float, default=1.0)
+    optional.add_argument("--stall_restarts", help="stop a problem after this many restarts without improvement (walksat engine only)", required=False, type=int, default=None)
+    optional.add_argument("--stall_fraction", help="stop a problem after this fraction of its time without improvement", required=False, type=float, default=None)
+    optional.add_argument('-T', "--total_budget", help="total time in seconds for the whole directory, shared out between the problem files", required=False, type=float, default=None)
+    optional.add_argument("--no_preprocess", help="search the cnf as given, without removing tautologies, merging duplicates and fixing pure and dominating unit literals", required=False, action='store_true')
+    optional.add_argument("--engine", help="walksat: free / noise / greedy moves, paws: moves steered by dynamic clause weights", required=False, choices=ENGINES, default='walksat')
+    optional.add_argument("--paws_flat", help="probability of a paws move which leaves the weighted score unchanged", required=False, type=float, default=0.15)
+    optional.add_argument("--paws_decrease_period", help="number of paws weight increases between two decreases", required=False, type=int, default=10)
+    optional.add_argument("--checkpoint_dir", help="directory to keep a checkpoint of the best assignment, counters and random state of every problem in", required=False, default=None)
+    optional.add_argument("--checkpoint_interval", help="seconds between two checkpoints", required=False, type=float, default=60.0)
+    optional.add_argument("--resume", help="continue every problem from its checkpoint in --checkpoint_dir", required=False, action='store_true')
+    optional.add_argument("--lookahead", help="number of flips of a greedy walkSAT move, the following flips repair the clauses broken by the previous one", required=False, type=int, default=2)
 
     args = parser.parse_args()
-    s = MAXSatSolver(args.timeout_in_seconds, args.max_flips, args.noise, args.verbose)
-    s.solveCNFFiles(args.absolute_path)
+    if args.engine == 'paws' and args.stall_restarts:
+        parser.error('--engine paws never restarts, use --stall_fraction instead of --stall_restarts')
+    if args.engine == 'paws' and args.portfolio_max_flips:
+        parser.error('--engine paws never restarts, --portfolio_max_flips would make its workers restart')
+    s = MAXSatSolver(args.timeout_in_seconds, max_flips=args.max_flips, noise=args.noise, log=args.verbose,
+                     population=args.population, cache_dir=args.cache_dir, workers=args.workers,
+                     portfolio_noise=args.portfolio_noise, portfolio_max_flips=args.portfolio_max_flips, random_seed=args.seed,
+                     stats_path=args.stats_path, stats_interval=args.stats_interval, preprocess=not args.no_preprocess,
+                     exact=args.exact, exact_max_vars=args.exact_max_vars, exact_walk_sec=args.exact_walk_sec,
+                     stall_restarts=args.stall_restarts, stall_fraction=args.stall_fraction, total_budget=args.total_budget,
+                     engine=args.engine, paws_flat=args.paws_flat, paws_decrease_period=args.paws_decrease_period,
+                     checkpoint_dir=args.checkpoint_dir, checkpoint_interval=args.checkpoint_interval, resume=args.resume,
+                     lookahead=args.lookahead)
+    if args.results_path:
+        s.solveCNFFilesBatch(args.absolute_path, args.results_path)
+    elif args.total_budget:
+        s.solveCNFFilesScheduled(args.absolute_path)
+    else:
+        s.solveCNFFiles(args.absolute_path)
 
 if __name__ == "__main__":
     main()
     # s = MAXSatSolver(10)
 
-    # print(s.getCompressedKey([True, False, True, False]))
-    # print(s.getCompressedKey([True, True, True, True]))
-    # print(s.getCompressedKey([True, True, False, False, True]))
-    # print(s.getCompressedKey([True, False, False, False, True, False]))
     # for max_steps in range(10, 150, 10):
     #     print('max_steps: {}'.format(max_steps))
     #     s = MAXSatSolver(30, max_steps, 0.2)
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import socket
+import hashlib
+import argparse
+import traceback
+import SocketServer
+from time import time
+from threading import Lock
+from collections import OrderedDict
+from maxSAT import MAXSatSolver
+
+# NOTE: number of prepared instances kept by a service, the least recently solved are dropped first
+DEFAULT_CACHE_SIZE = 8
+DEFAULT_TIMEOUT_SEC = 10.0
+# NOTE: the largest timeout and population a job may ask for, larger values are cut down to these
+DEFAULT_MAX_TIMEOUT_SEC = 60.0
+DEFAULT_MAX_POPULATION = 64
+# NOTE: a connection which sends no job for this many seconds is closed
+IDLE_TIMEOUT_SEC = 60.0
+# NOTE: the MAXSatSolver keyword arguments a job may set, the ones writing files (stats_path, checkpoint_dir, cache_dir)
+# or forking processes (workers) are refused as any local user can reach the service
+SEARCH_OPTIONS = frozenset(['max_flips', 'noise', 'population', 'random_seed', 'preprocess', 'exact', 'exact_max_vars', 'exact_walk_sec',
+                            'stall_restarts', 'stall_fraction', 'engine', 'paws_flat', 'paws_decrease_period', 'lookahead'])
+
+
+class InstanceCache():
+    """
+    a least recently used cache of parsed, preprocessed and indexed instances keyed by the hash of the problem text
+    so a repeated job starts searching without parsing or preprocessing its instance again
+    the cache is shared by the jobs of all connections, a prepared instance is only read by the searches
+    """
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def load(self, solver, text):
+        """
+        set up @param solver with the instance of the problem @param text in the generator format
+        return its prepared instance for solver._search and whether it came from the cache
+        """
+        # NOTE: the preprocessed instance differs with preprocessing on or off so both take part in the key
+        key = hashlib.md5(text + str(solver.preprocess)).hexdigest()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.hits += 1
+                self.entries[key] = entry
+        cached = entry is not None
+        if cached:
+            solver.no_vars, solver.no_literals_clause, solver.no_clauses, solver.cnf = entry[0]
+        else:
+            # NOTE: parsed outside the lock so a large problem does not hold up the jobs of the other connections
+            solver.parseCNF(text)
+            entry = ((solver.no_vars, solver.no_literals_clause, solver.no_clauses, solver.cnf), solver.prepareInstance())
+            with self.lock:
+                self.misses += 1
+                self.entries[key] = entry
+                while len(self.entries) > self.size:
+                    self.entries.popitem(last=False)
+        return entry[1], cached
+
+
+class SolverRequestHandler(SocketServer.StreamRequestHandler):
+    """
+    answer every json line job of a connection with a json line result
+
+    a job holds the problem either inline as 'cnf' or as the 'path' of a problem file below one of the --problem_dir of the service,
+    optionally 'timeout' in seconds, 'options' with the SEARCH_OPTIONS keyword arguments of MAXSatSolver and 'stream' to get an 'improvement' line with the time and satisfied count on every improvement
+    every connection is served by its own thread, a connection idle for IDLE_TIMEOUT_SEC is closed
+    """
+    timeout = IDLE_TIMEOUT_SEC
+
+    def handle(self):
+        try:
+            for line in iter(self.rfile.readline, ''):
+                if not line.strip():
+                    continue
+                try:
+                    result = self.solve(json.loads(line))
+                except Exception as err:
+                    if self.server.log:
+                        traceback.print_exc(file=sys.stdout)
+                    result = {'error': str(err)}
+                self.send(result)
+        except socket.timeout:
+            pass
+
+    def send(self, message):
+        self.wfile.write(json.dumps(message) + '\n')
+        self.wfile.flush()
+
+    def solve(self, job):
+        """
+        run the search of @param job and return its result record
+        """
+        init = time()
+        options = dict(job.get('options', {}))
+        refused = sorted(set(options) - SEARCH_OPTIONS)
+        if refused:
+            raise ValueError('options not allowed: {}'.format(', '.join(refused)))
+        if 'population' in options:
+            options['population'] = min(int(options['population']), self.server.max_population)
+        # NOTE: the random generators are process wide, a random_seed only makes a job reproducible while no other job runs
+        solver = MAXSatSolver(min(float(job.get('timeout', self.server.timeout_in_seconds)), self.server.max_timeout), **options)
+        if job.get('stream'):
+            solver.improvement_callback = lambda time_to_best, satisfied, assignment: self.send({'improvement': [time_to_best, satisfied]})
+        if 'cnf' in job:
+            text = job['cnf'].encode('ascii')
+        else:
+            with open(self.server.getProblemPath(job['path'])) as file:
+                text = file.read()
+        try:
+            prepared, cached = self.server.instances.load(solver, text)
+        except (ValueError, IndexError):
+            # NOTE: the parse error would quote the text, which must not leak the content of a file back to the client
+            raise ValueError('the problem is not in the generator format')
+        del text
+        load_time = time() - init
+        solver._search(prepared)
+        record = {
+            'no_vars': solver.no_vars,
+            'no_literals_clause': solver.no_literals_clause,
+            'no_clauses': solver.no_clauses,
+            'cached': cached,
+            'load_time': load_time,
+            'satisfied': solver.satisfiedCount(solver.best_assignment),
+            'time_to_best': solver.time_to_best,
+            'time': time() - init,
+            'restarts': solver.restarts,
+            'flips': solver.flips,
+            'proven_optimal': solver.proven_optimal,
+            'assignment': [var_i+1 if value else -(var_i+1) for var_i, value in enumerate(solver.best_assignment)],
+        }
+        if self.server.log:
+            print('{} satisfied: {} cached: {} load time: {:.6f} time: {:.6f}'.format(
+                job.get('path', 'inline'), record['satisfied'], cached, load_time, record['time']))
+        return record
+
+
+class SolverServerMixIn():
+    """
+    the settings and the instance cache shared by the unix socket and the tcp solver services
+    """
+    # NOTE: a connection left open by its client must not keep the service from stopping
+    daemon_threads = True
+
+    def setUp(self, timeout_in_seconds, cache_size, problem_dirs=(), log=False,
+              max_timeout=DEFAULT_MAX_TIMEOUT_SEC, max_population=DEFAULT_MAX_POPULATION):
+        self.timeout_in_seconds = min(timeout_in_seconds, max_timeout)
+        self.max_timeout = max_timeout
+        self.max_population = max_population
+        self.instances = InstanceCache(cache_size)
+        self.problem_dirs = [os.path.realpath(problem_dir) for problem_dir in problem_dirs]
+        self.log = log
+
+    def getProblemPath(self, path):
+        """
+        return the real path of the problem file @param path of a job, which has to be below one of self.problem_dirs
+        """
+        real_path = os.path.realpath(path)
+        if not any(real_path.startswith(problem_dir + os.sep) for problem_dir in self.problem_dirs):
+            raise ValueError('problem files are only read from the --problem_dir of the service, send the problem inline as cnf instead')
+        return real_path
+
+
+class UnixSolverServer(SolverServerMixIn, SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """
+    a solver service on a local unix socket, the jobs of every connection are solved in a thread of the long lived service process
+    """
+    def __init__(self, path, timeout_in_seconds, cache_size, problem_dirs=(), log=False,
+                 max_timeout=DEFAULT_MAX_TIMEOUT_SEC, max_population=DEFAULT_MAX_POPULATION):
+        if os.path.exists(path):
+            os.remove(path)
+        SocketServer.UnixStreamServer.__init__(self, path, SolverRequestHandler)
+        # NOTE: only the user running the service may connect to its socket
+        os.chmod(path, 0600)
+        self.setUp(timeout_in_seconds, cache_size, problem_dirs, log, max_timeout, max_population)
+
+
+class TCPSolverServer(SolverServerMixIn, SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+    """
+    a solver service on a tcp port, the jobs of every connection are solved in a thread of the long lived service process
+    """
+    allow_reuse_address = True
+
+    def __init__(self, address, timeout_in_seconds, cache_size, problem_dirs=(), log=False,
+                 max_timeout=DEFAULT_MAX_TIMEOUT_SEC, max_population=DEFAULT_MAX_POPULATION):
+        SocketServer.TCPServer.__init__(self, address, SolverRequestHandler)
+        self.setUp(timeout_in_seconds, cache_size, problem_dirs, log, max_timeout, max_population)
+
+
+def submit(address, job):
+    """
+    send @param job to the solver service listening on @param address, a unix socket path or a (host, port) tuple
+    and return its result record, the improvements streamed before it are printed
+    """
+    client = socket.socket(socket.AF_UNIX if isinstance(address, basestring) else socket.AF_INET, socket.SOCK_STREAM)
+    client.connect(address)
+    try:
+        client.sendall(json.dumps(job) + '\n')
+        for line in client.makefile():
+            record = json.loads(line)
+            if 'improvement' in record:
+                print "%2.6f" % record['improvement'][0], "\t", record['improvement'][1]
+                continue
+            return record
+    finally:
+        client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep the MAX-SAT solver running as a local service with a cache of the parsed problems, or submit a problem to it")
+    parser.add_argument("-u", "--unix_socket", help="path of the unix socket of the service", default=None)
+    parser.add_argument("-p", "--port", help="tcp port of the service on --host instead of a unix socket", type=int, default=None)
+    parser.add_argument("--host", help="host of the tcp service", default='127.0.0.1')
+    parser.add_argument("-t", "--timeout_in_seconds", help="search time in seconds of the jobs which do not give their own", type=float, default=DEFAULT_TIMEOUT_SEC)
+    parser.add_argument("--cache_size", help="number of parsed and preprocessed problems kept by the service", type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument("--max_timeout", help="largest timeout in seconds a job may ask for", type=float, default=DEFAULT_MAX_TIMEOUT_SEC)
+    parser.add_argument("--max_population", help="largest population a job may ask for", type=int, default=DEFAULT_MAX_POPULATION)
+    parser.add_argument("--problem_dir", help="directory the service may read problem files from by path, jobs may always send the problem inline", action='append', default=[])
+    parser.add_argument("-f", "--file_name", help="submit this problem file inline to the running service instead of starting one", default=None)
+    parser.add_argument("-o", "--options", help="json object of the submitted job's MAXSatSolver keyword arguments: " + ', '.join(sorted(SEARCH_OPTIONS)), type=json.loads, default={})
+    parser.add_argument("-v", "--verbose", help="log every job of the service, stream the improvements of the submitted job", action='store_true')
+    args = parser.parse_args()
+
+    if args.port is None and args.unix_socket is None:
+        parser.error('one of --unix_socket or --port is required')
+    address = (args.host, args.port) if args.port is not None else args.unix_socket
+
+    if args.file_name:
+        with open(args.file_name) as file:
+            job = {'cnf': file.read(), 'timeout': args.timeout_in_seconds, 'options': args.options, 'stream': args.verbose}
+        record = submit(address, job)
+        if 'error' in record:
+            print "Error solving", args.file_name, "\nerr:", record['error']
+            return 1
+        print('number of satisfied clauses: {} cached: {} load time: {:.6f} time to best: {:.6f} time: {:.6f}'.format(
+            record['satisfied'], record['cached'], record['load_time'], record['time_to_best'], record['time']))
+        return 0
+
+    if args.port is not None:
+        server = TCPSolverServer(address, args.timeout_in_seconds, args.cache_size, args.problem_dir, args.verbose,
+                                 args.max_timeout, args.max_population)
+    else:
+        server = UnixSolverServer(address, args.timeout_in_seconds, args.cache_size, args.problem_dir, args.verbose,
+                                  args.max_timeout, args.max_population)
+    print('solver service listening on {}'.format(address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\nstopping the solver service')
+    finally:
+        server.server_close()
+        if args.port is None and os.path.exists(address):
+            os.remove(address)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())